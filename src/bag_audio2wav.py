@@ -16,29 +16,129 @@
 #
 import audio_common_msgs
 import time
+import wave
 from read_bag_ros2 import BagReader
 import argparse
-import numpy as np
+
+# bytes per sample for the audio_common sample formats that wav supports
+SAMPLE_WIDTHS = {'U8': 1, 'S16LE': 2, 'S24LE': 3, 'S32LE': 4}
+
+# audio_capture defaults, used if the bag has no audio info
+DEFAULT_INFO = {'channels': 1, 'sample_rate': 16000,
+                'sample_format': 'S16LE', 'coding_format': 'wave'}
+
+
+def read_first(bag_path, topic):
+    """read_first(): first (msg, t_rec) on topic, or None if there is none"""
+    bag = BagReader(bag_path, topic)
+    if not bag.has_next():
+        return None
+    _, msg, t_rec = bag.read_next()
+    return msg, t_rec
+
+
+def get_audio_info(args):
+    """get_audio_info():
+    audio format from the command line, falling back to the bag's audio
+    info topic, then to the audio_capture defaults
+    """
+    info = dict(DEFAULT_INFO)
+    first = read_first(args.bagfile, args.info_topic)
+    if first is not None:
+        msg = first[0]
+        info.update(channels=msg.channels, sample_rate=msg.sample_rate,
+                    sample_format=msg.sample_format,
+                    coding_format=msg.coding_format)
+    else:
+        print(f'no audio info on {args.info_topic}, using defaults!')
+    for k in ('channels', 'sample_rate', 'sample_format'):
+        if getattr(args, k) is not None:
+            info[k] = getattr(args, k)
+    return info
+
+
+class RawWriter():
+    """Writes audio packets unchanged, e.g. for mp3 coded audio."""
+
+    def __init__(self, fname):
+        self.file = open(fname, 'wb')
+
+    def writeframesraw(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+def open_writer(fname, info):
+    """open_writer(): wav writer for pcm audio, raw writer otherwise"""
+    if info['coding_format'] != 'wave':
+        print(f"WARNING: audio is {info['coding_format']} coded,",
+              'writing packets without wav header!')
+        return RawWriter(fname)
+    if info['sample_format'] not in SAMPLE_WIDTHS:
+        raise ValueError(f"unsupported sample format {info['sample_format']}")
+    w = wave.open(str(fname), 'wb')
+    w.setnchannels(info['channels'])
+    w.setsampwidth(SAMPLE_WIDTHS[info['sample_format']])
+    w.setframerate(info['sample_rate'])
+    return w
 
 
 def main(args):
+    info = get_audio_info(args)
+    frame_size = info['channels'] * SAMPLE_WIDTHS.get(info['sample_format'], 1)
+    t_align = None  # recording time [ns] the audio should start at
+    if args.align_topic is not None and info['coding_format'] == 'wave':
+        first = read_first(args.bagfile, args.align_topic)
+        if first is None:
+            print(f'no messages on {args.align_topic}, not aligning!')
+        else:
+            t_align = first[1]
+    offset = 0  # number of bytes still to drop
+
     bag = BagReader(args.bagfile, args.topic)
     t0 = time.time()
     num_msgs = 0
-    outfile = open(args.output_file, 'a')
+    num_bytes = 0
+    batch = bytearray()
+    writer = open_writer(args.output_file, info)
     print(f"writing to file {args.output_file}")
 
     while bag.has_next():
         topic, msg, t_rec = bag.read_next()
-        if isinstance(msg, audio_common_msgs.msg.AudioData):
-            arr = np.array(msg.data)
-            arr.tofile(outfile)
-            num_msgs = num_msgs + 1
+        if not isinstance(msg, audio_common_msgs.msg.AudioData):
+            continue
+        data = memoryview(msg.data).cast('B')
+        if t_align is not None and num_msgs == 0:
+            # drop the audio before t_align, or pad with silence up to it
+            offset = round((t_align - t_rec) * 1e-9 * info['sample_rate']) \
+                * frame_size
+            if offset < 0:
+                silence = 128 if info['sample_format'] == 'U8' else 0
+                batch += bytes([silence]) * -offset
+                offset = 0
+        if offset > 0:
+            n = min(offset, len(data))
+            data = data[n:]
+            offset -= n
+        batch += data
+        num_msgs = num_msgs + 1
+        if len(batch) >= args.batch_size:
+            writer.writeframesraw(batch)
+            num_bytes += len(batch)
+            batch.clear()
+    writer.writeframesraw(batch)
+    num_bytes += len(batch)
+    writer.close()
     t1 = time.time()
     dt = t1 - t0
     print(f'took {dt:.3f}s to read {num_msgs} audio',
           f' packets ({num_msgs / dt:.3f} packets/s)')
-    outfile.close()
+    if info['coding_format'] == 'wave':
+        print(f"wrote {num_bytes // frame_size / info['sample_rate']:.3f}s",
+              f"of {info['channels']} channel {info['sample_format']}",
+              f"audio at {info['sample_rate']}Hz")
 
 
 if __name__ == '__main__':
@@ -47,8 +147,22 @@ if __name__ == '__main__':
                         default='audio.wav', help='output wav file')
     parser.add_argument('--topic', '-t', action='store',
                         default='/audio/audio', help='topic name')
+    parser.add_argument('--info_topic', '-i', action='store',
+                        default='/audio/audio_info',
+                        help='topic with the audio format')
+    parser.add_argument('--channels', action='store', default=None,
+                        type=int, help='number of channels (overrides bag)')
+    parser.add_argument('--sample_rate', action='store', default=None,
+                        type=int, help='sample rate in Hz (overrides bag)')
+    parser.add_argument('--sample_format', action='store', default=None,
+                        choices=list(SAMPLE_WIDTHS.keys()),
+                        help='sample format (overrides bag)')
+    parser.add_argument('--align_topic', '-a', action='store', default=None,
+                        help='trim or pad the audio so it starts with the ' +
+                        'first message on this topic, e.g. the event topic')
+    parser.add_argument('--batch_size', action='store', default=1 << 20,
+                        type=int, help='bytes to collect per file write')
     parser.add_argument('bagfile')
 
     args = parser.parse_args()
     main(args)
-    
@@ -39,27 +39,12 @@ def set_font_size(axs, fontsize):
 
 
 def find_periods(data):
-    last_t = [None, None]
-    last_p = None
-    period = [[], []]
-    times = [[], []]
-    for d in data:
-        t = d[0]
-        p = d[1]
-        if last_p is not None and last_p != p:
-            if p:
-                if last_t[0] is not None:
-                    period[0].append(t - last_t[0])
-                    times[0].append((last_t[0], t))
-                last_t[0] = t
-            else:
-                if last_t[1] is not None:
-                    period[1].append(t - last_t[1])
-                    times[1].append((last_t[1], t))
-                last_t[1] = t
-        last_p = p
-    return 1e-9 * np.array(times[0]), 1e-9 * np.array(period[0]), \
-        1e-9 * np.array(times[1]), 1e-9 * np.array(period[1])
+    t = data[:, 0]
+    result = []
+    for idx in core_filtering.find_polarity_transitions(data[:, 1]):
+        result.append(1e-9 * np.column_stack((t[idx[:-1]], t[idx[1:]])))
+        result.append(1e-9 * (t[idx[1:]] - t[idx[:-1]]))
+    return tuple(result)
 
 
 def draw_arrows(ax, t, all_too, label, level, fontsize, color):
@@ -139,10 +124,10 @@ def plot_pixel(args, times_and_periods, data):
 
 def plot_pixels(args, array, res):
     """main function to plot pixels"""
-    active_pixels = [idx for idx, d in enumerate(array) if d.shape[0] > 0]
-    print(active_pixels)
-    print('number of active pixels: ', len(active_pixels))
-    print('top active pixels: ', active_pixels[0:min(10, len(active_pixels))])
+    print('number of active pixels: ', len(array.active_pixels()))
+    top, counts = array.top_pixels(10)
+    print('top active pixels: ', top.tolist())
+    print('their event counts: ', counts.tolist())
     for p in args.pixel:
         data = array[p]
         if args.filter_pass_dt > 0:
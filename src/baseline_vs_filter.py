@@ -19,7 +19,7 @@
 import matplotlib.pyplot as plt
 import argparse
 import numpy as np
-import read_bag_ros2
+import graph_loader
 import yaml
 import core_filtering
 
@@ -141,12 +141,9 @@ if __name__ == '__main__':
     cfg = read_yaml(args.config_file)
     fig, axs = plt.subplots(nrows=len(cfg['graphs']), ncols=1, sharex=False,)
 
-    for ax, c in zip(axs, cfg['graphs']):
-        array, res = read_bag_ros2.read_as_array(
-            bag_path=cfg['base_dir'] + '/' + c['bag'], topic=args.topic,
-            use_sensor_time=True, skip=c['skip'],
-            max_read=c['max_read'])
-        make_graph(ax,  args, array[args.pixel], res,
+    pixel_data = graph_loader.load_graphs(cfg, args.pixel, args.topic)
+    for ax, c, (data, res) in zip(axs, cfg['graphs'], pixel_data):
+        make_graph(ax,  args, data, res,
                    cutoff_period=c['cutoff_period'],gt=c['ground_truth'])
                             
     #fig.tight_layout()
@@ -17,6 +17,8 @@
 
 import numpy as np
 import math
+from functools import lru_cache
+from scipy.signal import lfilter, lfiltic
 
 
 def filter_noise(d, dt_cutoff, dt_dead):
@@ -24,75 +26,112 @@ def filter_noise(d, dt_cutoff, dt_dead):
     set to ultra-fast speed."""
     t = d[:, 0] * 1e-9
     p = d[:, 1].astype(np.int32) * 2 - 1
-    d_f = []
-    skip_counter = 0
-    for i in range(4, d.shape[0]):
-        if skip_counter == 0:
-            d_f.append((d[i - 4, 0], d[i - 4, 1]))
-        else:
-            skip_counter -= 1
-        if p[i - 2] < 0 and p[i - 1] > 0 and \
-           t[i - 1] - t[i - 2] < dt_cutoff and \
-           t[i - 2] - t[i - 3] > dt_dead:
-            skip_counter = 4
-    n_filt = d.shape[0] - len(d_f)
+    n = d.shape[0]
+    # an OFF/ON pair at (j - 2, j - 1) that follows quickly after a dead
+    # time triggers the suppression of events j - 3 ... j
+    trigger = np.zeros(max(n, 4), dtype=bool)
+    trigger[4:] = (p[2:-2] < 0) & (p[3:-1] > 0) & \
+        (t[3:-1] - t[2:-2] < dt_cutoff) & (t[2:-2] - t[1:-3] > dt_dead)
+    # event i is dropped if any of the triggers i ... i + 3 fired
+    cnt = np.concatenate(([0], np.cumsum(trigger)))
+    keep = cnt[4:n] - cnt[:max(n - 4, 0)] == 0
+    # the last four events are never emitted
+    d_f = d[:max(n - 4, 0)][keep]
+    n_filt = d.shape[0] - d_f.shape[0]
     print(f'filtered {n_filt} of {d.shape[0]} events ({n_filt/d.shape[0]}%)')
-    return np.array(d_f)
+    return d_f
 
 
-def find_periods_baseline(data, L, T):
-    last_t = [None, None]
-    last_p = None
-    period = [[], []]
-    times = [[], []]
-    cnt = int(0)
-    period_omit = 2 * int(round(T))
-    for i, d in enumerate(data):
-        t = d[0]
-        p = d[1]
-        if last_p is not None and last_p != p:
-            if p:
-                if last_t[0] is not None and cnt > period_omit:
-                    period[0].append(t - last_t[0])
-                    times[0].append((t, last_t[0], 1e9 * L[i]))
-                last_t[0] = t
-            else:
-                if last_t[1] is not None and cnt > period_omit:
-                    period[1].append(t - last_t[1])
-                    times[1].append((t, last_t[1], 1e9 * L[i]))
-                last_t[1] = t
-        last_p = p
-        cnt += 1
-    return 1e-9 * np.array(times[0]), 1e-9 * np.array(period[0]), \
-        1e-9 * np.array(times[1]), 1e-9 * np.array(period[1])
+def find_polarity_transitions(p):
+    """find_polarity_transitions() returns the indices of the events whose
+    polarity differs from the preceding event, split into transitions to
+    ON and transitions to OFF"""
+    flip = np.flatnonzero(p[1:] != p[:-1]) + 1
+    on = p[flip] != 0
+    return flip[on], flip[~on]
+
+
+def find_periods_baseline(data, L, T, period_omit=None):
+    """find_periods_baseline() computes the ON->ON and OFF->OFF periods
+    between polarity transitions. Periods ending at an event index
+    <= period_omit (default: 2 * cutoff period) are dropped."""
+    if period_omit is None:
+        period_omit = 2 * int(round(T))
+    t = data[:, 0]
+    result = []
+    for idx in find_polarity_transitions(data[:, 1]):
+        cur, prev = idx[1:], idx[:-1]
+        keep = cur > period_omit
+        cur, prev = cur[keep], prev[keep]
+        result.append(1e-9 * np.column_stack((t[cur], t[prev], 1e9 * L[cur])))
+        result.append(1e-9 * (t[cur] - t[prev]))
+    return tuple(result)
 
 
+@lru_cache(maxsize=1024)
 def compute_alpha_for_cutoff(cutoff_period):
     omega = 2 * np.pi / cutoff_period
     return (1 - math.sin(omega)) / math.cos(omega)
 
 
+@lru_cache(maxsize=1024)
 def compute_beta_for_cutoff(cutoff_period):
     omega = 2 * np.pi / cutoff_period
     x = 2 - math.cos(omega)
     return x - math.sqrt(x**2 - 1)
 
 
-def filter_iir(x, alpha, beta, start_x):
-    # x is polarity, should be +1 or -1
-    a1 = alpha + beta
-    a2 = - alpha * beta
-    a3 = 0.5 * (1 + beta)
-    x_cum = []
-    last_x = start_x[0]       # one lag back
-    last_last_x = start_x[1]  # two lags back
-    last_p = 0  # could also use x[0]
-    for p in x:
-        x_cum.append(a1 * last_x + a2 * last_last_x + a3 * (p - last_p))
-        last_last_x = last_x
-        last_x = x_cum[-1]
-        last_p = p
-    return np.array(x_cum)
+def recursion_coefficients(alpha, beta):
+    """recursion_coefficients() returns (a1, a2, a3) of the filter recursion
+    L[n] = a1 * L[n-1] + a2 * L[n-2] + a3 * (x[n] - x[n-1])"""
+    return alpha + beta, - alpha * beta, 0.5 * (1 + beta)
+
+
+def iir_coefficients(alpha, beta):
+    """iir_coefficients() returns (b, a) of the filter run by filter_iir()"""
+    # the recursion is a linear filter with b = (a3, -a3), a = (1, -a1, -a2)
+    a1, a2, a3 = recursion_coefficients(alpha, beta)
+    return np.array([a3, -a3]), np.array([1.0, -a1, -a2])
+
+
+def filter_step(coeffs, last_x, last_last_x, last_p, pol):
+    """filter_step() advances the recursion by one event (polarity pol)
+    for a set of pixels with the given state, and returns their new L"""
+    a1, a2, a3 = coeffs
+    return a1 * last_x + a2 * last_last_x + a3 * (pol - last_p)
+
+
+def rank_schedule(counts):
+    """rank_schedule() returns the order in which the batch filters step
+    over the events by their rank within the pixel:
+    - the pixels with events, sorted by decreasing number of events so
+      the pixels that have an event of a given rank always form a prefix
+    - for each rank, the length of that prefix
+    """
+    order = np.argsort(-counts, kind='stable')
+    sorted_counts = counts[order]
+    num_active = np.count_nonzero(sorted_counts)
+    max_count = sorted_counts[0] if num_active > 0 else 0
+    k_rank = np.searchsorted(-sorted_counts[:num_active],
+                             -np.arange(max_count), side='left')
+    return order[:num_active], k_rank
+
+
+def filter_iir(x, alpha, beta, start_x, last_p=0, return_state=False):
+    """filter_iir() runs the detrend + lowpass filter over the polarities
+    x (+1 or -1). start_x is (one lag back, two lags back) of the filter
+    output, last_p the polarity preceding x. With return_state=True it also
+    returns the final state as ((last_x, last_last_x), last_p) so a later
+    call can continue where this one stopped."""
+    b, a = iir_coefficients(alpha, beta)
+    x = np.asarray(x, dtype=np.float64)
+    zi = lfiltic(b, a, y=(start_x[0], start_x[1]), x=(last_p,))
+    x_cum, _ = lfilter(b, a, x, zi=zi)
+    if not return_state:
+        return x_cum
+    hist = np.concatenate(((start_x[1], start_x[0]), x_cum[-2:]))
+    state = (hist[-1], hist[-2])
+    return x_cum, state, (x[-1] if x.shape[0] > 0 else last_p)
 
 
 def reconstruct(data, T):
@@ -102,40 +141,156 @@ def reconstruct(data, T):
     return  filter_iir(dL, alpha, beta, (0, 0))
 
 
+def reconstruct_batch(t, p, offsets, T):
+    """reconstruct_batch() runs the filter of reconstruct() for all pixels
+    at once. The events must be in CSR layout, i.e. sorted by pixel with
+    the events of pixel i at offsets[i]:offsets[i + 1].
+    Rather than looping over pixels, it steps over the event rank within
+    the pixel and updates the filter state of all pixels that have an
+    event of that rank in one vectorized operation.
+    Returns:
+    - L for all events (same layout as t and p)
+    - interpolated times of the zero crossings (from above to below zero)
+      in CSR layout, plus their offsets per pixel
+    """
+    coeffs = recursion_coefficients(compute_alpha_for_cutoff(T),
+                                    compute_beta_for_cutoff(T))
+    dL = np.where(p == 0, -1.0, 1.0)
+    counts = np.diff(offsets)
+    active, k_rank = rank_schedule(counts)
+    num_active = active.shape[0]
+    starts = offsets[active]
+    last_x = np.zeros(num_active)
+    last_last_x = np.zeros(num_active)
+    last_p = np.zeros(num_active)
+    L_all = np.empty(dL.shape[0])
+    for rank, k in enumerate(k_rank):
+        idx = starts[:k] + rank
+        pol = dL[idx]
+        L = filter_step(coeffs, last_x[:k], last_last_x[:k], last_p[:k], pol)
+        L_all[idx] = L
+        last_last_x[:k] = last_x[:k]
+        last_x[:k] = L
+        last_p[:k] = pol
+    # zero crossings, ignoring the boundaries between pixels
+    is_first = np.zeros(dL.shape[0], dtype=bool)
+    is_first[offsets[:-1][counts > 0]] = True
+    cross = np.flatnonzero((L_all[:-1] > 0) & (L_all[1:] < 0)
+                           & ~is_first[1:]) + 1
+    t_prev, L_prev = t[cross - 1], L_all[cross - 1]
+    t_cross = t_prev - (t[cross] - t_prev) * L_prev \
+        / (L_all[cross] - L_prev)
+    pixel = np.searchsorted(offsets, cross, side='right') - 1
+    cross_offsets = np.zeros(offsets.shape[0], dtype=np.int64)
+    np.cumsum(np.bincount(pixel, minlength=offsets.shape[0] - 1),
+              out=cross_offsets[1:])
+    return L_all, t_cross, cross_offsets
+
+
+def find_zero_crossings(L_all, upper_half=False):
+    """find_zero_crossings() returns the indices i where L goes from above
+    zero (at i - 1) to below zero (at i). upper_half is the assumed state
+    before the first element."""
+    above = np.empty(L_all.shape[0], dtype=bool)
+    above[:1] = upper_half
+    above[1:] = L_all[:-1] > 0
+    return np.flatnonzero(above & (L_all < 0))
+
+
+def interpolate_crossings(t_all, L_all, idx):
+    """interpolate_crossings() linearly interpolates the time when L crosses
+    zero between events idx - 1 and idx"""
+    t_prev, L_prev = t_all[idx - 1], L_all[idx - 1]
+    return t_prev - (t_all[idx] - t_prev) * L_prev / (L_all[idx] - L_prev)
+
+
+def crossing_periods(t_all, L_all, idx, t_prev=None, t_interp_prev=None):
+    """crossing_periods() turns the zero crossings at idx into periods as
+    returned by find_periods_filtered(). t_prev and t_interp_prev are the
+    times of the crossing before idx[0], if there is one."""
+    t = t_all[idx]
+    t_interp = interpolate_crossings(t_all, L_all, idx)
+    if t_prev is None:
+        t_last = np.concatenate((t[:1], t[:-1]))
+        t_interp_last = np.concatenate((t_interp[:1], t_interp[:-1]))
+        first = 1  # the very first crossing has no period
+    else:
+        t_last = np.concatenate((np.array([t_prev], dtype=t.dtype),
+                                 t))[:-1]
+        t_interp_last = np.concatenate(([t_interp_prev], t_interp))[:-1]
+        first = 0
+    t_flip = np.column_stack((t, t_last, L_all[idx] * 1e9))
+    t_flip_interp = np.column_stack((t_interp, t_interp_last,
+                                     np.zeros(t_interp.shape[0])))
+    return (1e-9 * t_flip, 1e-9 * (t - t_last)[first:],
+            1e-9 * t_flip_interp, 1e-9 * (t_interp - t_interp_last)[first:])
+
+
 def find_periods_filtered(data, L_all, T):
     t_all = data[:, 0]
 
     # drop the first 2 * cutoff period
     period_omit = 2 * int(round(T))
-    t_prev, L_prev = None, None
-    t_flip, t_flip_interp = [], []
-    dt, dt_interp = [], []
-    upper_half = False
-    cnt = 0
-    for t, L in zip(t_all, L_all):
-        if upper_half and L < 0:
-            if cnt > period_omit:
-                # regular periods
-                if t_flip: # has element
-                    dt.append(t - t_flip[-1][0])
-                    t_flip.append((t, t_flip[-1][0], L * 1e9))
-                else:
-                    t_flip.append((t, t, L * 1e9))
-                # ------ interpolated periods
-                if L_prev:
-                    dt_int = t - t_prev
-                    dL_int = L - L_prev
-                    t_interp = t_prev - dt_int * L_prev / dL_int
-                    if t_flip_interp:
-                        dt_interp.append(t_interp - t_flip_interp[-1][0])
-                        t_flip_interp.append((t_interp, t_flip_interp[-1][0], 0))
-                    else:
-                        t_flip_interp.append((t_interp, t_interp, 0))
-        upper_half = L > 0
-        t_prev = t  # for interpolation
-        L_prev = L  # for interpolation
-        cnt += 1
-
-    return (1e-9 * np.array(t_flip), 1e-9 * np.array(dt),
-            1e-9 * np.array(t_flip_interp), 1e-9 * np.array(dt_interp)), t_all, L_all
+    idx = find_zero_crossings(L_all)
+    idx = idx[idx > period_omit]
+    return crossing_periods(t_all, L_all, idx), t_all, L_all
+
+
+class PixelFilter():
+    """Filter state of one pixel, so its events can be fed in chunks.
+
+    update() gives exactly the same L and periods as reconstruct()
+    followed by find_periods_filtered() over the concatenated chunks.
+    Besides last_x, last_last_x and last_p the state keeps the internal
+    state zi of lfilter(), because rebuilding it from the last outputs
+    does not round the same way.
+    """
+
+    __slots__ = ('b', 'a', 'zi', 'period_omit', 'last_x', 'last_last_x',
+                 'last_p', 'last_t', 'num_events', 't_cross',
+                 't_cross_interp')
+
+    def __init__(self, T):
+        self.b, self.a = iir_coefficients(compute_alpha_for_cutoff(T),
+                                          compute_beta_for_cutoff(T))
+        self.zi = lfiltic(self.b, self.a, y=(0, 0), x=(0,))
+        self.period_omit = 2 * int(round(T))  # warm-up, in events
+        self.last_x = 0.0
+        self.last_last_x = 0.0
+        self.last_p = 0
+        self.last_t = 0
+        self.num_events = 0
+        self.t_cross = None  # time of previous zero crossing
+        self.t_cross_interp = None
 
+    def update(self, data):
+        """update() filters the next chunk of events (rows of time stamp
+        and polarity). Returns L for the chunk and the periods
+        (t_flip, dt, t_flip_interp, dt_interp) of its zero crossings."""
+        t = data[:, 0]
+        n = t.shape[0]
+        dL = np.where(data[:, 1] == 0, -1.0, 1.0)
+        # prepend the last event of the previous chunk so crossings and
+        # their interpolation can reach back across the chunk boundary
+        t_ext = np.empty(n + 1, dtype=t.dtype)
+        t_ext[0] = self.last_t
+        t_ext[1:] = t
+        L_ext = np.empty(n + 1)
+        L_ext[0] = self.last_x
+        if n > 0:  # lfilter() returns garbage state for empty input
+            L_ext[1:], self.zi = lfilter(self.b, self.a, dL, zi=self.zi)
+        idx = find_zero_crossings(L_ext[1:], upper_half=L_ext[0] > 0) + 1
+        idx = idx[idx + self.num_events - 1 > self.period_omit]
+        periods = crossing_periods(t_ext, L_ext, idx, self.t_cross,
+                                   self.t_cross_interp)
+        if idx.shape[0] > 0:
+            self.t_cross = t_ext[idx[-1]]
+            self.t_cross_interp = interpolate_crossings(t_ext, L_ext,
+                                                        idx[-1:])[0]
+        if n > 0:
+            self.last_last_x = L_ext[-2]
+            self.last_x = L_ext[-1]
+            self.last_p = dL[-1]
+            self.last_t = t[-1]
+        self.num_events += n
+        return L_ext[1:], periods
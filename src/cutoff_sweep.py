@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+# -----------------------------------------------------------------------------
+# Copyright 2022 Bernd Pfrommer <bernd.pfrommer@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Find the cutoff period and noise filter dt that best recover the
+ground truth period of each bag in a yaml graph config."""
+
+import argparse
+import os
+import time
+import numpy as np
+import yaml
+from concurrent.futures import ProcessPoolExecutor
+import graph_loader
+import core_filtering
+
+# pixel data of all bags, handed to each worker process once
+worker_data = []
+filtered_cache = {}
+
+
+def read_yaml(filename):
+    with open(filename, 'r') as y:
+        try:
+            return yaml.safe_load(y)
+        except yaml.YAMLError as e:
+            print(e)
+
+
+def get_skip_key(cfg):
+    """get_skip_key(): the roi_scaling configs use skip_read, others skip"""
+    return 'skip_read' if all('skip_read' in c for c in cfg['graphs']) \
+        else 'skip'
+
+
+def get_ground_truth(cfg, gt_is_frequency=False):
+    """get_ground_truth():
+    ground truth period [s] of each bag, from the bag's or the config's
+    ground_truth entry, which is a frequency [Hz] if gt_is_frequency is
+    set. Bags without ground truth get None.
+    """
+    gts = [c.get('ground_truth', cfg.get('ground_truth'))
+           for c in cfg['graphs']]
+    if gt_is_frequency:
+        gts = [None if gt is None else 1.0 / gt for gt in gts]
+    return gts
+
+
+def init_worker(pixel_data):
+    global worker_data
+    worker_data = pixel_data
+
+
+def get_filtered(graph, filter_dt):
+    """get_filtered(): noise filtered data, computed once per worker"""
+    key = (graph, filter_dt)
+    if key not in filtered_cache:
+        data = worker_data[graph]
+        if filter_dt > 0:
+            data = core_filtering.filter_noise(data, filter_dt, filter_dt)
+        filtered_cache[key] = data
+    return filtered_cache[key]
+
+
+def evaluate(graph, filter_dt, cutoff_periods, gt):
+    """evaluate():
+    reconstructs one bag's pixel with every cutoff period and compares
+    the interpolated periods with the ground truth period gt.
+    returns array with rows (cutoff period, rms error, mean error, std,
+    number of periods)
+    """
+    data = get_filtered(graph, filter_dt)
+    result = np.full((len(cutoff_periods), 5), np.inf)
+    result[:, 0] = cutoff_periods
+    result[:, 4] = 0
+    for i, T in enumerate(cutoff_periods):
+        L = core_filtering.reconstruct(data, T)
+        periods = core_filtering.find_periods_filtered(data, L, T)[0][3]
+        if periods.shape[0] < 2:
+            continue
+        err = periods - gt
+        result[i, 1:] = (np.sqrt(np.mean(err**2)), err.mean(), err.std(),
+                         periods.shape[0])
+    return result
+
+
+def sweep(cfg, pixel_data, cutoff_periods, filter_dts, gts,
+          max_workers=None):
+    """sweep():
+    runs evaluate() for all bags and noise filter settings in parallel,
+    with the ground truth periods gts (one per bag).
+    returns list (one per bag) of arrays with rows (filter dt, cutoff
+    period, rms error, mean error, std, number of periods)
+    """
+    graphs = cfg['graphs']
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # split the cutoff periods so there are enough tasks for all workers
+    num_chunks = min(len(cutoff_periods), max(1, -(-4 * max_workers // (
+        len(graphs) * len(filter_dts)))))
+    chunks = np.array_split(cutoff_periods, num_chunks)
+    data = [np.asarray(d) for d, _ in pixel_data]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(data,)) as pool:
+        futures = [[[pool.submit(evaluate, i, dt, chunk, gts[i])
+                     for chunk in chunks] for dt in filter_dts]
+                   for i in range(len(graphs))]
+        results = []
+        for fs in futures:
+            results.append(np.vstack([np.column_stack(
+                (np.full(len(cutoff_periods), dt),
+                 np.vstack([f.result() for f in fc])))
+                for fc, dt in zip(fs, filter_dts)]))
+    return results
+
+
+def print_best(cfg, results):
+    print(f"{'bag':30s} {'cutoff':>8s} {'filter dt':>10s} " +
+          f"{'rms err':>12s} {'mean err':>12s} {'std':>12s} {'periods':>8s}")
+    for c, r in zip(cfg['graphs'], results):
+        b = r[np.argmin(r[:, 2])]
+        if not np.isfinite(b[2]):
+            print(f"{c['bag']:30s} no periods found")
+            continue
+        print(f"{c['bag']:30s} {b[1]:8.1f} {b[0]:10.2e} " +
+              f"{b[2]:12.4e} {b[3]:12.4e} {b[4]:12.4e} {int(b[5]):8d}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='sweep cutoff period and noise filter dt per bag.')
+    parser.add_argument('--topic', '-t', action='store',
+                        default='/event_camera/events',
+                        required=False, help='ros topic')
+    parser.add_argument('--pixel', '-p', action='store', default=None,
+                        required=True, type=int,
+                        help='which pixel to evaluate')
+    parser.add_argument('--config_file', action='store', default=None,
+                        required=True,
+                        help='yaml file with graphs, including ground_truth')
+    parser.add_argument('--cutoff_range', action='store', nargs=3,
+                        default=(5, 400, 80), type=float,
+                        help='min, max and number of cutoff periods ' +
+                        '(geometric spacing)')
+    parser.add_argument('--filter_dt', action='store', nargs='+',
+                        default=(0, 5e-6, 10e-6, 15e-6, 20e-6), type=float,
+                        help='noise filter pass/dead dt values (0 = off)')
+    parser.add_argument('--skip_key', action='store', default=None,
+                        help='config key with the events to skip ' +
+                        '(default: skip_read if all bags have it, else skip)')
+    parser.add_argument('--gt_is_frequency', action='store_true',
+                        help='ground_truth is a frequency [Hz], not a ' +
+                        'period [s] (as in the roi_scaling configs)')
+    parser.add_argument('--workers', '-w', action='store', default=None,
+                        type=int, help='number of worker processes')
+    parser.add_argument('--output', '-o', action='store', default=None,
+                        help='text file to write all results to')
+    args = parser.parse_args()
+
+    cfg = read_yaml(args.config_file)
+    gts = get_ground_truth(cfg, args.gt_is_frequency)
+    missing = [c['bag'] for c, gt in zip(cfg['graphs'], gts) if gt is None]
+    if missing:
+        parser.error('no ground_truth in config for bag(s): ' +
+                     ', '.join(missing))
+    cutoff_periods = np.unique(np.round(np.geomspace(
+        args.cutoff_range[0], args.cutoff_range[1],
+        int(args.cutoff_range[2]))))
+    # only one pixel is needed, so do not group the whole sensor. The
+    # filter works on nanosecond time stamps.
+    pixel_data = graph_loader.load_graphs(
+        cfg, args.pixel, args.topic, reader='pixels',
+        skip_key=args.skip_key or get_skip_key(cfg), time_ns=True)
+    start_time = time.time()
+    results = sweep(cfg, pixel_data, cutoff_periods, args.filter_dt, gts,
+                    args.workers)
+    print(f'took {time.time() - start_time:.3f}s to evaluate ' +
+          f'{len(cutoff_periods) * len(args.filter_dt)} settings per bag')
+    print_best(cfg, results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            for c, r in zip(cfg['graphs'], results):
+                f.write(f"# bag: {c['bag']}\n")
+                np.savetxt(f, r, header='filter_dt cutoff_period rms_err ' +
+                           'mean_err std num_periods')
@@ -0,0 +1,118 @@
+# -----------------------------------------------------------------------------
+# Copyright 2022 Bernd Pfrommer <bernd.pfrommer@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Filter coefficients and transfer functions, vectorized over omega and
+cutoff period."""
+
+from functools import lru_cache
+import numpy as np
+import core_filtering
+
+
+def alpha_for_cutoff(cutoff_period):
+    """alpha_for_cutoff(): same as core_filtering.compute_alpha_for_cutoff(),
+    but for arrays of cutoff periods"""
+    omega = 2 * np.pi / np.asarray(cutoff_period, dtype=np.float64)
+    return (1 - np.sin(omega)) / np.cos(omega)
+
+
+def beta_for_cutoff(cutoff_period):
+    """beta_for_cutoff(): same as core_filtering.compute_beta_for_cutoff(),
+    but for arrays of cutoff periods"""
+    omega = 2 * np.pi / np.asarray(cutoff_period, dtype=np.float64)
+    x = 2 - np.cos(omega)
+    return x - np.sqrt(x**2 - 1)
+
+
+def coefficients(cutoff_period):
+    """coefficients(): (alpha, beta) for a cutoff period, memoized"""
+    return (core_filtering.compute_alpha_for_cutoff(cutoff_period),
+            core_filtering.compute_beta_for_cutoff(cutoff_period))
+
+
+def alpha_for_max(omega):
+    """alpha_for_max(): alpha that puts the maximum of H_alpha at omega"""
+    co = np.cos(omega)
+    return 2 - co - np.sqrt(3 - 4 * co + co**2)
+
+
+def H_alpha_detrend_sq(omega, alpha):
+    """H_alpha_detrend_sq(): |H_alpha|^2 of the detrend filter"""
+    co = np.cos(omega)
+    # 2 - 2 cos(omega), written so it stays accurate at small omega
+    return 4 * np.sin(0.5 * omega)**2 / (1 - 2 * alpha * co + alpha * alpha)
+
+
+def H_beta_norm_sq(omega, beta):
+    """H_beta_norm_sq(): |H_beta|^2 of the lowpass, normalized to 1 at 0"""
+    return (1 - beta)**2 / (1 + beta**2 - 2 * beta * np.cos(omega))
+
+
+def cos_omega_max(alpha, beta):
+    """cos_omega_max(): cos of the frequency where |H|^2 peaks"""
+    a = alpha + 1 / alpha
+    b = beta + 1 / beta
+    return 1 - np.sqrt(1 - 0.5 * a - 0.5 * b + 0.25 * a * b)
+
+
+def H_max_sq(alpha, beta):
+    """H_max_sq(): peak value of |H|^2"""
+    y = 2 * cos_omega_max(alpha, beta)
+    a = alpha + 1 / alpha
+    b = beta + 1 / beta
+    return (1 + beta)**2 / (4 * alpha * beta) * (2 - y) / ((y - a) * (y - b))
+
+
+def H_sq(omega, alpha, beta):
+    """H_sq(): |H|^2 of the combined filter, i.e. of
+    H = (z - 1) / (z - alpha) * 0.5 * z * (1 + beta) / (z - beta)"""
+    co = np.cos(omega)
+    return H_alpha_detrend_sq(omega, alpha) \
+        * 0.25 * (1 + beta)**2 / (1 + beta**2 - 2 * beta * co)
+
+
+def response_surface(cutoff_periods, omega):
+    """response_surface():
+    |H|^2 normalized to its peak, for all combinations of cutoff period
+    (rows) and omega (columns)
+    """
+    alpha = alpha_for_cutoff(cutoff_periods)[:, np.newaxis]
+    beta = beta_for_cutoff(cutoff_periods)[:, np.newaxis]
+    return H_sq(np.asarray(omega)[np.newaxis, :], alpha, beta) \
+        / H_max_sq(alpha, beta)
+
+
+def peak_omega(cutoff_periods):
+    """peak_omega(): frequency (rad/event) where |H|^2 peaks"""
+    return np.arccos(cos_omega_max(alpha_for_cutoff(cutoff_periods),
+                                   beta_for_cutoff(cutoff_periods)))
+
+
+@lru_cache(maxsize=64)
+def response_curves(cutoff_period, num_points=100, omega_min=1e-4):
+    """response_curves():
+    returns (omega, |H_alpha|^2, |H_beta|^2, |H|^2) on num_points
+    frequencies from omega_min to pi, each curve normalized to its
+    maximum. Memoized, so treat the arrays as read-only.
+    """
+    alpha, beta = coefficients(cutoff_period)
+    omega = np.linspace(omega_min, np.pi, num_points)
+    curves = (omega, H_alpha_detrend_sq(omega, alpha) * (1 + alpha)**2 / 4,
+              H_beta_norm_sq(omega, beta),
+              H_sq(omega, alpha, beta) / H_max_sq(alpha, beta))
+    for c in curves:
+        c.flags.writeable = False
+    return curves
@@ -0,0 +1,145 @@
+# -----------------------------------------------------------------------------
+# Copyright 2022 Bernd Pfrommer <bernd.pfrommer@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Whole-frame frequency map computed with the filter of core_filtering."""
+
+import numpy as np
+import core_filtering
+
+
+class FrequencyMap():
+    """Per-pixel frequency estimation, vectorized over all pixels.
+
+    Every pixel runs the detrend + lowpass filter of core_filtering on
+    its events. Each time the filtered signal L crosses zero from above,
+    the time between this crossing and the previous one is taken as a
+    period. Periods between 1 / max_frequency and 1 / min_frequency are
+    averaged per pixel. The filter state lives in flat arrays with one
+    entry per pixel.
+
+    Usage mirrors the Metavision FrequencyMapAsyncAlgorithm: register a
+    callback with set_output_callback() and feed EventCD chunks to
+    process_events(). The callback gets (ts, freq_map) every
+    1 / publishing_frequency seconds of event time, freq_map is a
+    float32 (height, width) image that is zero where no frequency is
+    known.
+    """
+
+    def __init__(self, width, height, min_frequency, max_frequency,
+                 cutoff_period=5.0, publishing_frequency=100.0,
+                 dt_averaging_alpha=0.1, timeout_cycles=2.0,
+                 time_scale=1e-6):
+        self.width = width
+        self.height = height
+        self.dt_min = 1.0 / max_frequency
+        self.dt_max = 1.0 / min_frequency
+        self.dt_mix = dt_averaging_alpha
+        self.timeout_cycles = timeout_cycles
+        self.time_scale = time_scale  # seconds per event time unit
+        self.coeffs = core_filtering.recursion_coefficients(
+            core_filtering.compute_alpha_for_cutoff(cutoff_period),
+            core_filtering.compute_beta_for_cutoff(cutoff_period))
+        n = width * height
+        self.last_x = np.zeros(n)
+        self.last_last_x = np.zeros(n)
+        self.last_p = np.zeros(n)
+        self.last_t = np.zeros(n)
+        self.t_flip = np.full(n, np.nan)  # time of last zero crossing
+        self.dt_avg = np.full(n, np.nan)  # averaged period [s]
+        self.publishing_period = 1.0 / publishing_frequency
+        self.t_next_frame = None
+        self.callback = None
+
+    def set_output_callback(self, callback):
+        self.callback = callback
+
+    def process_events(self, evs):
+        """process_events(): update with the next chunk of EventCD events
+        (sorted by time), calling the output callback at frame times"""
+        if evs.shape[0] == 0:
+            return
+        t = evs['t'] * self.time_scale
+        if self.t_next_frame is None:
+            self.t_next_frame = t[0] + self.publishing_period
+        start = 0
+        while True:
+            end = np.searchsorted(t, self.t_next_frame, side='left')
+            if end >= t.shape[0]:
+                break
+            self.update(evs[start:end], t[start:end])
+            if self.callback is not None:
+                self.callback(int(round(self.t_next_frame / self.time_scale)),
+                              self.frequency_image(self.t_next_frame))
+            self.t_next_frame += self.publishing_period
+            start = end
+        self.update(evs[start:], t[start:])
+
+    def update(self, evs, t):
+        """update(): runs the filter over events with times t [s]"""
+        if evs.shape[0] == 0:
+            return
+        idx = evs['x'].astype(np.int64) + evs['y'].astype(np.int64) \
+            * self.width
+        pol = np.where(evs['p'] == 0, -1.0, 1.0)
+        # group by pixel, then step over the event rank within the pixel
+        # as in core_filtering.reconstruct_batch()
+        order = np.argsort(idx, kind='stable')
+        idx, pol, t = idx[order], pol[order], t[order]
+        pixels, starts, counts = np.unique(idx, return_index=True,
+                                           return_counts=True)
+        active, k_rank = core_filtering.rank_schedule(counts)
+        pixels, starts = pixels[active], starts[active]
+        for rank, k in enumerate(k_rank):
+            pix = pixels[:k]
+            i = starts[:k] + rank
+            self.step(pix, pol[i], t[i])
+
+    def step(self, pix, pol, t):
+        """step(): filter one event for each of the (distinct) pixels pix"""
+        L_prev = self.last_x[pix]
+        L = core_filtering.filter_step(self.coeffs, L_prev,
+                                       self.last_last_x[pix],
+                                       self.last_p[pix], pol)
+        cross = (L_prev > 0) & (L < 0)
+        if np.any(cross):
+            c = pix[cross]
+            t_prev = self.last_t[c]
+            t_cross = t_prev - (t[cross] - t_prev) * L_prev[cross] \
+                / (L[cross] - L_prev[cross])
+            dt = t_cross - self.t_flip[c]
+            good = (dt >= self.dt_min) & (dt <= self.dt_max)
+            g = c[good]
+            avg = self.dt_avg[g]
+            self.dt_avg[g] = np.where(
+                np.isnan(avg), dt[good],
+                (1 - self.dt_mix) * avg + self.dt_mix * dt[good])
+            self.t_flip[c] = t_cross
+        self.last_last_x[pix] = L_prev
+        self.last_x[pix] = L
+        self.last_p[pix] = pol
+        self.last_t[pix] = t
+
+    def frequency_image(self, t_now):
+        """frequency_image():
+        frequency [Hz] per pixel at time t_now [s], zero for pixels without
+        a valid period or whose last crossing timed out
+        """
+        valid = ~np.isnan(self.dt_avg)
+        valid[valid] = t_now - self.t_flip[valid] \
+            <= self.timeout_cycles * self.dt_avg[valid]
+        freq = np.zeros(self.dt_avg.shape[0], dtype=np.float32)
+        freq[valid] = 1.0 / self.dt_avg[valid]
+        return freq.reshape(self.height, self.width)
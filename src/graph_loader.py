@@ -0,0 +1,81 @@
+# -----------------------------------------------------------------------------
+# Copyright 2022 Bernd Pfrommer <bernd.pfrommer@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Load one pixel from each bag of a yaml graph config in parallel."""
+
+import os
+import time
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import read_bag_ros2
+
+
+def load_pixel(reader, bag_path, topic, pixel, skip, max_read, fname,
+               time_ns=False):
+    """load_pixel():
+    worker that reads a bag, saves the events of a single pixel
+    to fname, and returns the sensor resolution
+    """
+    # the graphs read the same bags over and over, so build the event
+    # cache even if max_read does not say that the whole bag is wanted
+    read_bag_ros2.read_event_cache(bag_path, topic, True)
+    if reader == 'pixels':
+        array, res = read_bag_ros2.read_events_for_pixels(
+            bag_path=bag_path, pixel_list=[pixel], topic=topic,
+            use_sensor_time=True, skip=skip, max_read=max_read,
+            converter=read_bag_ros2.NanosecondConverter() if time_ns else
+            read_bag_ros2.EventCDConverter())
+    else:
+        array, res = read_bag_ros2.read_as_array(
+            bag_path=bag_path, topic=topic, use_sensor_time=True,
+            skip=skip, max_read=max_read)
+    np.save(fname, np.asarray(array[pixel]))
+    return res
+
+
+def load_graphs(cfg, pixel, topic, reader='array', skip_key='skip',
+                max_workers=None, time_ns=False):
+    """load_graphs():
+    reads the bags of all cfg['graphs'] entries in separate processes.
+    The workers hand back the pixel data through memory-mapped files
+    so nothing large is pickled.
+    reader is 'array' (read_as_array) or 'pixels' (read_events_for_pixels)
+    The 'pixels' reader gives time stamps in usec, or in nsec like the
+    'array' reader if time_ns is set.
+    returns list with one (pixel data, resolution) tuple per graph
+    """
+    start_time = time.time()
+    graphs = cfg['graphs']
+    if max_workers is None:
+        max_workers = min(len(graphs), os.cpu_count() or 1)
+    # the directory and its files are removed even if a worker fails
+    with tempfile.TemporaryDirectory(prefix='graph_loader_') as tmp_dir:
+        fnames = [os.path.join(tmp_dir, f'graph_{i}.npy')
+                  for i in range(len(graphs))]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(load_pixel, reader,
+                                   cfg['base_dir'] + '/' + c['bag'], topic,
+                                   pixel, c[skip_key], c['max_read'], f,
+                                   time_ns)
+                       for c, f in zip(graphs, fnames)]
+            resolutions = [f.result() for f in futures]
+        # the memory maps keep the data alive after the files are gone
+        pixel_data = [(np.load(fname, mmap_mode='r'), res)
+                      for fname, res in zip(fnames, resolutions)]
+    dt = time.time() - start_time
+    print(f'took {dt:.3f}s to load {len(graphs)} bags')
+    return pixel_data
@@ -15,67 +15,172 @@
 # limitations under the License.
 #
 #
-"""Compute frequency image using the metavision SDK's analytics."""
+"""Compute frequency image using the metavision SDK's analytics,
+or the in-repo NumPy FrequencyMap (no SDK needed)."""
 
 import cv2
 import numpy as np
 import argparse
-from metavision_sdk_analytics import FrequencyMapAsyncAlgorithm
-from pathlib import Path
-from read_bag_ros2 import read_bag, EventCDConverter
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from read_bag_ros2 import iter_events, EventCDConverter
+from video_sink import JpegSink, VideoSink
 
 # global variables to keep track of current frame, events etc
 
-output_dir = ""  # output directory name
-last_events = []
+background = None  # pixels with events since the last frame
 t_curr = 0   # current time stamp
 frame_count = 0  # current frame
 frame_time_stamps = []
 freq_range = np.array([0, 0])
 use_log_scale = False
+frame_writer = None
+# JET color for each of the 256 scaled frequency values
+color_lut = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(-1, 1),
+                              cv2.COLORMAP_JET).reshape(256, 3)
+frame_buffers = threading.local()  # reusable frame of each writer thread
 
 
-def make_bg_image(img, events):
-    """Make background image of events."""
-    for evts in events:
-        x = evts[:]['x']
-        y = evts[:]['y']
-        img[y, x, :] = 128  # set all events gray
+class EventBackground():
+    """Tracks which pixels had events since the last frame.
+
+    add() marks the pixels of each event chunk in an occupancy bitmap and
+    remembers the newly marked ones, so take() can hand out and reset
+    the active pixels without scanning the whole sensor.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.occupied = np.zeros(width * height, dtype=bool)
+        self.active = []
+
+    def add(self, evs):
+        idx = evs['x'].astype(np.int64) + evs['y'].astype(np.int64) \
+            * self.width
+        new = idx[~self.occupied[idx]]  # may repeat within a chunk
+        self.occupied[new] = True
+        self.active.append(new)
+
+    def take(self):
+        """take(): flat indices of the active pixels, then clears them"""
+        active = np.concatenate(self.active) if self.active else \
+            np.empty(0, dtype=np.int64)
+        self.occupied[active] = False
+        self.active = []
+        return active
+
+
+def get_frame_buffer(shape):
+    """get_frame_buffer():
+    the calling thread's frame buffer, cleared where the previous frame
+    drew, so only the touched pixels cost work
+    """
+    buf = getattr(frame_buffers, 'img', None)
+    if buf is None or buf.shape[:2] != shape:
+        frame_buffers.img = np.zeros(shape + (3,), dtype=np.uint8)
+        frame_buffers.touched = np.empty(0, dtype=np.int64)
+    img = frame_buffers.img
+    img.reshape(-1, 3)[frame_buffers.touched] = 0
     return img
 
 
+def write_image(frame, shape, freq_idx, freq, bg_idx, sink):
+    """write_image():
+    render the frequencies freq at flat pixel indices freq_idx over the
+    event background bg_idx, and hand the frame to the sink
+    """
+    img = None
+    try:
+        if freq_idx.shape[0] > 0:
+            img = get_frame_buffer(shape)
+            # record what gets drawn first, so the buffer is cleared for
+            # the next frame even if drawing fails half way
+            frame_buffers.touched = np.concatenate((bg_idx, freq_idx))
+            pixels = img.reshape(-1, 3)
+            pixels[bg_idx] = 128  # set all events gray
+            fr_tf = np.log10(freq_range) if use_log_scale else freq_range
+            freq_tf = np.log10(freq) if use_log_scale else freq
+            r = fr_tf[1] - fr_tf[0]
+            # scale into range of 0..255 like cv2.convertScaleAbs()
+            scaled = np.clip(np.rint(np.abs(
+                freq_tf * (255.0 / r) - fr_tf[0] * 255.0 / r)), 0, 255)
+            pixels[freq_idx] = color_lut[scaled.astype(np.uint8)]
+            if frame % 10 == 0:
+                print('writing image: ', frame)
+        else:
+            print('writing empty image: ', frame)
+            img = np.zeros(shape + (3,), dtype=np.uint8)
+    finally:
+        # on errors img is None, so later frames do not wait for this one
+        sink.write(frame, img)
+
+
+class FrameWriter():
+    """Renders and writes frames on a thread pool.
+
+    cv2 releases the GIL while color mapping and encoding, so the
+    writer threads run in parallel with the event processing. At most
+    max_pending frames are queued; beyond that submit() blocks, which
+    bounds the memory held by queued frames.
+    """
+
+    def __init__(self, sink, num_threads=None, max_pending=32):
+        self.sink = sink
+        self.pool = ThreadPoolExecutor(
+            max_workers=num_threads or os.cpu_count() or 1)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.errors = []
+
+    def done(self, future):
+        self.slots.release()
+        if future.exception() is not None:
+            self.errors.append(future.exception())
+
+    def submit(self, *args):
+        self.slots.acquire()
+        self.pool.submit(write_image, *args, self.sink).add_done_callback(
+            self.done)
+
+    def close(self):
+        """close(): wait for all frames to be written"""
+        self.pool.shutdown(wait=True)
+        self.sink.close()
+        if self.errors:
+            raise self.errors[0]
+
+
 def write_image_cb(ts, freq_map):
-    global last_events
     global frame_count
     # print(ts, t_curr)
-    img = np.zeros([freq_map.shape[0], freq_map.shape[1], 3], dtype=np.uint8)
-    img = make_bg_image(img, last_events)
-    last_events = []  # clear out all events
-    nz_idx = freq_map > 0  # indices of non-zero elements of frequency map
-    fname = str(Path(output_dir) / f"frame_{frame_count:05d}.jpg")
-
-    if nz_idx.sum() > 0:
-        fr_tf = np.log10(freq_range) if use_log_scale else freq_range
-        freq_map_tf = \
-            np.where(freq_map > 0, np.log10(freq_map), 0) if use_log_scale \
-            else freq_map
-        r = fr_tf[1] - fr_tf[0]
-        # scale image into range of 0..255
-        scaled = cv2.convertScaleAbs(freq_map_tf, alpha=255.0 / r,
-                                     beta=-fr_tf[0] * 255.0 / r)
-        img_scaled = cv2.applyColorMap(scaled, cv2.COLORMAP_JET)
-        img[nz_idx, :] = img_scaled[nz_idx, :]
-        if frame_count % 10 == 0:
-            print('writing image: ', frame_count)
-        cv2.imwrite(fname, img)
-    else:
-        print('writing empty image: ', fname)
-        cv2.imwrite(fname, np.zeros_like(freq_map, dtype=np.uint8))
+    # hand only the valid (positive) frequencies and the active pixels to
+    # the writer, the algorithm may reuse freq_map
+    freq_idx = np.flatnonzero(freq_map > 0)
+    frame_writer.submit(frame_count, freq_map.shape,
+                        freq_idx, freq_map.reshape(-1)[freq_idx],
+                        background.take())
 
     frame_time_stamps.append((t_curr * 1000, frame_count))
     frame_count += 1
 
 
+def make_algo(args, width, height):
+    """make_algo(): frequency map algorithm selected by args.engine"""
+    if args.engine == 'numpy':
+        from frequency_map import FrequencyMap
+        return FrequencyMap(
+            width, height, min_frequency=args.freq_min,
+            max_frequency=args.freq_max, cutoff_period=args.cutoff_period,
+            publishing_frequency=args.update_freq)
+    from metavision_sdk_analytics import FrequencyMapAsyncAlgorithm
+    algo = FrequencyMapAsyncAlgorithm(
+        width=width, height=height, filter_length=args.filter_length,
+        min_freq=args.freq_min, max_freq=args.freq_max,
+        diff_thresh_us=args.diff_thresh)
+    algo.update_frequency = args.update_freq
+    return algo
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='compute frequency image with metavision SDK.')
@@ -99,31 +204,45 @@ if __name__ == '__main__':
                         default='mv_timestamps.txt')
     parser.add_argument('--output_dir', help='name of output directory',
                         default='frames')
+    parser.add_argument('--video', help='write frames to this video file '
+                        'instead of jpeg files to output_dir', default=None)
+    parser.add_argument('--fps', help='video frame rate (default: update_freq)',
+                        default=None, type=float)
+    parser.add_argument('--audio', help='audio file (e.g. wav) to add to video',
+                        default=None)
     parser.add_argument('--log_scale', action='store_true',
                         required=False, help='color frequency on log scale')
+    parser.add_argument('--engine', choices=('metavision', 'numpy'),
+                        default='metavision',
+                        help='frequency map implementation to use')
+    parser.add_argument('--cutoff_period',
+                        help='filter cutoff period (#events, numpy engine)',
+                        default=5.0, type=float)
+    parser.add_argument('--writer_threads',
+                        help='number of threads writing frames',
+                        default=None, type=int)
     parser.set_defaults(log_scale=False)
 
     args = parser.parse_args()
 
     use_log_scale = args.log_scale
 
-    events, res, _, _, _ = read_bag(args.bag, args.topic, converter=EventCDConverter())
-
-    algo = FrequencyMapAsyncAlgorithm(
-        width=res[0], height=res[1], filter_length=args.filter_length,
-        min_freq=args.freq_min, max_freq=args.freq_max,
-        diff_thresh_us=args.diff_thresh)
-    algo.update_frequency = args.update_freq
-    algo.set_output_callback(write_image_cb)
-
-    output_dir = args.output_dir
     freq_range = np.array([args.freq_min, args.freq_max])
 
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
-
-    for evs in events:
+    # stream the bag message by message so memory does not grow with it
+    algo = None
+    for width, height, _, evs in iter_events(
+            args.bag, args.topic, converter=EventCDConverter()):
+        if algo is None:
+            algo = make_algo(args, width, height)
+            algo.set_output_callback(write_image_cb)
+            background = EventBackground(width, height)
+            sink = VideoSink(args.video, width, height,
+                             args.fps or args.update_freq, args.audio) \
+                if args.video else JpegSink(args.output_dir)
+            frame_writer = FrameWriter(sink, args.writer_threads)
         if evs.size > 0:
-            last_events.append(evs)
+            background.add(evs)
             t_curr = evs[-1][3]
             # update the algo with events. Sometimes no callback happens,
             # I believe when the frequency map does not change.
@@ -131,6 +250,8 @@ if __name__ == '__main__':
             # that a few events are included that are later than
             # that time stamp
             algo.process_events(evs)
+    if frame_writer is not None:
+        frame_writer.close()
 
     np.savetxt(args.timestamp_file, np.array(frame_time_stamps).astype(np.uint64),
                fmt='%d')
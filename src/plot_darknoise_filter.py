@@ -90,10 +90,10 @@ def plot_pixel(args, data):
 
 def plot_pixels(args, array, res):
     """main function to plot pixels"""
-    active_pixels = [idx for idx, d in enumerate(array) if d.shape[0] > 0]
-    print(active_pixels)
-    print('number of active pixels: ', len(active_pixels))
-    print('top active pixels: ', active_pixels[0:min(10, len(active_pixels))])
+    print('number of active pixels: ', len(array.active_pixels()))
+    top, counts = array.top_pixels(10)
+    print('top active pixels: ', top.tolist())
+    print('their event counts: ', counts.tolist())
     for p in args.pixel:
         a = array[p]
         s = args.skip_events_plot
@@ -20,39 +20,10 @@
 
 import matplotlib.pyplot as plt
 import argparse
-import math
 import numpy as np
 import read_bag_ros2
 import core_filtering
-
-
-def compute_H_alpha_detrend_sq(omega, alpha):
-    return  (2 - 2 * math.cos(omega)) / (1 - 2 * alpha * math.cos(omega) + alpha * alpha)
-
-
-def compute_H_beta_norm_sq(omega, beta):
-    return  (1 - beta)**2 / (1 + beta**2 - 2 * beta * np.cos(omega))
-
-
-def compute_alpha_for_max(omega):
-    co = math.cos(omega)
-    alpha = 2 - co - math.sqrt(3 - 4 * co + co**2)
-    return (alpha)
-
-
-def compute_cos_omega_max(alpha, beta):
-    a = alpha + 1 / alpha
-    b = beta + 1 / beta
-    cos_omega_max = 1 - math.sqrt(1 - 0.5 * a - 0.5 * b + 0.25 * a * b)
-    return cos_omega_max
-
-
-def compute_H_max_sq(alpha, beta):
-    y = 2 * compute_cos_omega_max(alpha, beta)
-    a = alpha + 1 / alpha
-    b = beta + 1 / beta
-    H_max_sq = (1 + beta)**2 / (4 * alpha * beta) * (2 - y) / ((y - a) * (y - b))
-    return H_max_sq
+import filter_response
 
 
 def plot_filter(args):
@@ -66,30 +37,20 @@ def plot_filter(args):
                              if args.cutoff_period else 2.0 / alpha)
     print('omega_cut / pi: ', omega_cut / np.pi)
     print('test for H_alpha at 0.5: ',
-          compute_H_alpha_detrend_sq(omega_cut, alpha) /
-          compute_H_alpha_detrend_sq(np.pi, alpha))
-    omega = np.linspace(1e-4, np.pi, 100)
-    z = np.exp(1.0j * omega)
-    H_alpha = (z - 1) / (z - alpha)
-    H_alpha_sq = np.real(H_alpha * np.conjugate(H_alpha))
-    H_alpha_sq_max = 4 / (1 + alpha)**2
-    H_beta = 0.5 * z * (1 + beta) / (z - beta)
-    H_beta_n = 2 * (1 - beta) / (1 + beta)
-    H_beta_norm = H_beta_n * H_beta
-    H_beta_norm_sq = np.real(H_beta_norm * np.conjugate(H_beta_norm))
-    H_ab = H_alpha * H_beta
-    H_ab_sq = np.real(H_ab * np.conjugate(H_ab))
-    H_ab_norm_sq = compute_H_max_sq(alpha, beta)
+          filter_response.H_alpha_detrend_sq(omega_cut, alpha) /
+          filter_response.H_alpha_detrend_sq(np.pi, alpha))
+    omega, H_alpha_sq_n, H_beta_norm_sq, H_ab_sq_n = \
+        filter_response.response_curves(args.cutoff_period)
     _, axs = plt.subplots(1, 1)
     ia = 5
     iab = 3
     lw = 3
     fontsize = 40
-    axs.plot(omega[ia:] / np.pi, 10 * np.log10(H_alpha_sq[ia:] / H_alpha_sq_max),
+    axs.plot(omega[ia:] / np.pi, 10 * np.log10(H_alpha_sq_n[ia:]),
              '-', label=r'$|H_{\alpha}(\omega)|^2$', linewidth=lw)
     axs.plot(omega / np.pi, 10 * np.log10(H_beta_norm_sq), '-',
              label=r'$|H_{\beta}(\omega)|^2$', linewidth=lw)
-    axs.plot(omega[iab:] / np.pi, 10 * np.log10(H_ab_sq[iab:] / H_ab_norm_sq),
+    axs.plot(omega[iab:] / np.pi, 10 * np.log10(H_ab_sq_n[iab:]),
              '-',  label=r'$|H(\omega)|^2$', linewidth=2*lw, color='k')
     axs.plot((omega_cut / np.pi, omega_cut / np.pi), (0, -12),
              '--', label=r'$\omega_{cut}$', linewidth=lw)
@@ -178,7 +139,7 @@ def filter_pixel(args, data):
         T = args.cutoff_period * m
         alpha = core_filtering.compute_alpha_for_cutoff(T)
         beta  = core_filtering.compute_beta_for_cutoff(T)
-        # alpha = compute_alpha_for_max(2 * math.pi / T)
+        # alpha = filter_response.alpha_for_max(2 * np.pi / T)
         # beta = alpha
         dx = np.where(data[:, 1] == 0, -1, 1)
         L = core_filtering.filter_iir(dx, alpha, beta, (0, 0))
@@ -197,10 +158,10 @@ def filter_pixel(args, data):
 
 def plot_pixels(args, array, res):
     """main function to plot pixels"""
-    active_pixels = [idx for idx, d in enumerate(array) if d.shape[0] > 0]
-    print(active_pixels)
-    print('number of active pixels: ', len(active_pixels))
-    print('top active pixels: ', active_pixels[0:min(10, len(active_pixels))])
+    print('number of active pixels: ', len(array.active_pixels()))
+    top, counts = array.top_pixels(10)
+    print('top active pixels: ', top.tolist())
+    print('their event counts: ', counts.tolist())
     for p in args.pixel:
         a = array[p]
         s = args.skip_events_plot
@@ -210,10 +171,10 @@ def plot_pixels(args, array, res):
 
 def apply_filter(args, array, res):
     """main function to apply filter to pixel signal"""
-    active_pixels = [idx for idx, d in enumerate(array) if d.shape[0] > 0]
-    print(active_pixels)
-    print('number of active pixels: ', len(active_pixels))
-    print('top active pixels: ', active_pixels[0:min(10, len(active_pixels))])
+    print('number of active pixels: ', len(array.active_pixels()))
+    top, counts = array.top_pixels(10)
+    print('top active pixels: ', top.tolist())
+    print('their event counts: ', counts.tolist())
     for p in args.pixel:
         a = array[p]
         s = args.skip_events_plot
@@ -22,6 +22,13 @@
 
 import time
 import sys
+import os
+import json
+import sqlite3
+import queue
+import threading
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from rclpy.serialization import deserialize_message
 from rosidl_runtime_py.utilities import get_message
 import rosbag2_py
@@ -40,18 +47,34 @@ class BagReader():
         topic_types = self.reader.get_all_topics_and_types()
         self.type_map = {topic_types[i].name: topic_types[i].type
                          for i in range(len(topic_types))}
+        self.msg_types = {}
         storage_filter = rosbag2_py.StorageFilter(topics=[topics])
         self.reader.set_filter(storage_filter)
 
     def has_next(self):
         return self.reader.has_next()
 
+    def get_msg_type(self, topic):
+        """get_msg_type(): message class for topic, looked up only once"""
+        msg_type = self.msg_types.get(topic)
+        if msg_type is None:
+            msg_type = get_message(self.type_map[topic])
+            self.msg_types[topic] = msg_type
+        return msg_type
+
     def read_next(self):
         (topic, data, t_rec) = self.reader.read_next()
-        msg_type = get_message(self.type_map[topic])
-        msg = deserialize_message(data, msg_type)
+        msg = deserialize_message(data, self.get_msg_type(topic))
         return (topic, msg, t_rec)
 
+    def skip_next(self):
+        """skip_next(): advance by one message without deserializing it"""
+        self.reader.read_next()
+
+    def seek(self, t_rec):
+        """seek(): continue reading at the first message with t >= t_rec"""
+        self.reader.seek(t_rec)
+
     def get_rosbag_options(self, path, serialization_format='cdr'):
         storage_options = rosbag2_py.StorageOptions(uri=path, storage_id='sqlite3')
         converter_options = rosbag2_py.ConverterOptions(
@@ -60,19 +83,128 @@ class BagReader():
         return storage_options, converter_options
 
 
+class PrefetchBagReader(BagReader):
+    """PrefetchBagReader:
+    BagReader that fetches and deserializes messages on a worker thread,
+    so the caller can decode one message while the next is being read.
+    The rosbag2/rclpy C code drops the GIL for much of that work.
+    """
+
+    _done = object()  # queue marker for end of bag
+
+    def __init__(self, bag_name, topics, queue_size=16):
+        super().__init__(bag_name, topics)
+        self.queue_size = queue_size
+        self.thread = None
+        self.next_item = None
+
+    def worker(self, q, stop):
+        try:
+            while not stop.is_set() and self.reader.has_next():
+                item = BagReader.read_next(self)
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+        except Exception as e:
+            q.put(e)  # re-raised in the caller's thread
+        q.put(self._done)
+
+    def start(self):
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.worker, args=(self.queue, self.stop_event),
+            daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """close(): stop the worker thread, dropping prefetched messages"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        while self.thread.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.thread = None
+        self.next_item = None
+
+    def fetch(self):
+        if self.next_item is None:
+            if self.thread is None:
+                self.start()
+            self.next_item = self.queue.get()
+        if isinstance(self.next_item, Exception):
+            e, self.next_item = self.next_item, self._done
+            raise e
+        return self.next_item
+
+    def has_next(self):
+        return self.fetch() is not self._done
+
+    def read_next(self):
+        item = self.fetch()
+        if item is self._done:
+            raise StopIteration('no more messages in bag')
+        self.next_item = None
+        return item
+
+    def skip_next(self):
+        if self.thread is None:
+            super().skip_next()
+        else:
+            self.read_next()
+
+    def seek(self, t_rec):
+        self.close()
+        super().seek(t_rec)
+
+
+def unpack_words(data):
+    """unpack_words():
+    returns zero-copy views of the packed events: the 16 bit words as
+    (N, 4) array [t_low, t_high, x, y | p << 15] and the 32 bit time stamps.
+    """
+    words = np.frombuffer(data, dtype='<u2').reshape(-1, 4)
+    t = np.frombuffer(data, dtype='<u4')[::2]
+    return words, t
+
+
+def decode_into(data, time_base, out, ns=False):
+    """decode_into():
+    decodes the packed events straight into the (preallocated) EventCD
+    array out, without any temporaries of full message length.
+    Time stamps are in microseconds (limited to 44 bits as for
+    EventCDConverter) or in nanoseconds when ns=True.
+    returns the number of decoded events
+    """
+    words, t = unpack_words(data)
+    np.copyto(out['x'], words[:, 2])
+    np.bitwise_and(words[:, 3], 0x7FFF, out=out['y'])
+    np.right_shift(words[:, 3], 15, out=out['p'], casting='unsafe')
+    t_out = out['t']
+    np.add(t, np.int64(time_base), out=t_out)
+    if not ns:
+        # empirically cannot use more than 48 bits of the full time stamp
+        np.floor_divide(t_out, 1000, out=t_out)
+        np.bitwise_and(t_out, 0xFFFFFFFFFFF, out=t_out)
+    return t.shape[0]
+
+
 class ArrayConverter():
     def convert(msg, time_base):
         width = msg.width
         height = msg.height
         # unpack all events in the message
-        packed = np.frombuffer(msg.events, dtype=np.uint64)
-        y = np.bitwise_and(
-            np.right_shift(packed, 48), 0x7FFF).astype(np.uint16)
-        x = np.bitwise_and(
-            np.right_shift(packed, 32), 0xFFFF).astype(np.uint16)
-        t = (np.bitwise_and(packed, 0xFFFFFFFF)
-             + time_base).astype(np.int64) // 1000
-        p = np.right_shift(packed, 63).astype(np.int16)
+        words, t = unpack_words(msg.events)
+        y = words[:, 3] & 0x7FFF
+        x = words[:, 2].copy()
+        t = (t + np.int64(time_base)) // 1000
+        p = (words[:, 3] >> 15).astype(np.int16)
         return width, height, (x, y, p, t)
 
 
@@ -80,134 +212,883 @@ class EventCDConverter():
     def convert(self, msg, time_base):
         width = msg.width
         height = msg.height
-        # unpack all events in the message
-        packed = np.frombuffer(msg.events, dtype=np.uint64)
         evs = np.empty(len(msg.events) // 8, dtype=EventCD)
-        evs['y'] = np.bitwise_and(
-            np.right_shift(packed, 48), 0x7FFF).astype(np.uint16)
-        evs['x'] = np.bitwise_and(
-            np.right_shift(packed, 32), 0xFFFF).astype(np.uint16)
-        # empirically cannot use more than 48 bits of the full time stamp
-        evs['t'] = ((np.bitwise_and(packed, 0xFFFFFFFF)
-                    + time_base).astype(np.int64) // 1000) & 0xFFFFFFFFFFF
-        evs['p'] = np.right_shift(packed, 63).astype(np.int16)
+        decode_into(msg.events, time_base, evs)
         return width, height, evs
 
+    def convert_into(self, msg, time_base, out, offset):
+        """convert_into(): decode message into out[offset:], return count"""
+        n = len(msg.events) // 8
+        return decode_into(msg.events, time_base, out[offset:offset + n])
+
+    def convert_events(self, events, out=None):
+        # events come from the cache and have time stamps in nanoseconds
+        if out is None:
+            out = np.empty(events.shape[0], dtype=EventCD)
+        np.copyto(out, events)
+        t = out['t']
+        np.floor_divide(t, 1000, out=t)
+        np.bitwise_and(t, 0xFFFFFFFFFFF, out=t)
+        return out
+
     def offset(self, time_base):
         return ((time_base // 1000) & ~0xFFFFFFFFFFF)
 
 
+class NanosecondConverter(EventCDConverter):
+    """EventCD records with the full time stamp in nanoseconds, as in
+    the event cache and the arrays of read_as_array()."""
+
+    def convert(self, msg, time_base):
+        evs = np.empty(len(msg.events) // 8, dtype=EventCD)
+        decode_into(msg.events, time_base, evs, ns=True)
+        return msg.width, msg.height, evs
+
+    def convert_into(self, msg, time_base, out, offset):
+        n = len(msg.events) // 8
+        return decode_into(msg.events, time_base, out[offset:offset + n],
+                           ns=True)
+
+    def convert_events(self, events, out=None):
+        if out is None:
+            return events.copy()
+        np.copyto(out, events)
+        return out
+
+    def offset(self, time_base):
+        return 0
+
+
 def decode_packet(data, time_base):
     # Unpack all events in the message
     # This decoding is redundant but was needed to make the old
     # code work
-    packed = np.frombuffer(data, dtype=np.uint64)
-    y = np.bitwise_and(
-        np.right_shift(packed, 48), 0x7FFF).astype(np.uint16)
-    x = np.bitwise_and(
-        np.right_shift(packed, 32), 0xFFFF).astype(np.uint16)
-    t = np.bitwise_and(packed, 0xFFFFFFFF) + time_base
-    p = np.right_shift(packed, 63).astype(np.uint16)
+    words, t = unpack_words(data)
+    y = words[:, 3] & 0x7FFF
+    x = words[:, 2].copy()
+    t = t + np.uint64(time_base)
+    p = words[:, 3] >> 15
     return (t, x, y, p)
 
 
+class PacketConverter():
+    """Produces (t, x, y, p) tuples as returned by decode_packet()."""
+
+    def convert(self, msg, time_base):
+        return msg.width, msg.height, decode_packet(msg.events, time_base)
+
+    def convert_events(self, events):
+        return (events['t'].astype(np.uint64), events['x'], events['y'],
+                events['p'].astype(np.uint16))
+
+
+class EventBuffer():
+    """Growable EventCD array with amortized doubling.
+
+    Events are decoded directly into the free space at the end of
+    events, the valid part is events[:size].
+    """
+
+    def __init__(self, capacity=0, dtype=EventCD):
+        self.events = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def reserve(self, n):
+        """reserve(): make room for n more events"""
+        if self.size + n > self.events.shape[0]:
+            grown = np.empty(max(self.size + n, 2 * self.events.shape[0]),
+                             dtype=self.events.dtype)
+            grown[:self.size] = self.events[:self.size]
+            self.events = grown
+        return self.events[self.size:self.size + n]
+
+    def append(self, evs):
+        self.reserve(evs.shape[0])[:] = evs
+        self.size += evs.shape[0]
+
+    def array(self):
+        return self.events[:self.size]
+
+
+class EventCache():
+    """Decoded events of one bag topic, usually memory mapped from disk.
+
+    The events are EventCD records, but with the full time stamp in
+    nanoseconds. Message boundaries and time bases are kept as well so
+    the readers can reproduce their per-message skip/max_read behavior.
+    """
+
+    def __init__(self, events, msg_offsets, time_bases, res):
+        self.events = events
+        self.msg_offsets = msg_offsets
+        self.time_bases = time_bases
+        self.res = res
+
+    def messages(self, start_msg=0):
+        """messages(): yields (width, height, time_base, events)"""
+        for i in range(start_msg, self.time_bases.shape[0]):
+            yield (self.res[0], self.res[1], int(self.time_bases[i]),
+                   self.events[self.msg_offsets[i]:self.msg_offsets[i + 1]])
+
+
+def get_cache_dir(bag_path, topic, use_sensor_time):
+    """get_cache_dir(): cache lives inside the bag directory"""
+    bag_dir = str(bag_path) if os.path.isdir(str(bag_path)) else \
+        os.path.dirname(os.path.abspath(str(bag_path)))
+    name = topic.strip('/').replace('/', '_') + \
+        ('_sensor_time' if use_sensor_time else '_header_time')
+    return os.path.join(bag_dir, 'event_cache', name)
+
+
+def get_bag_mtime(bag_path):
+    """get_bag_mtime(): latest modification time of the bag's files"""
+    bag_path = str(bag_path)
+    if not os.path.isdir(bag_path):
+        return os.path.getmtime(bag_path)
+    return max([e.stat().st_mtime for e in os.scandir(bag_path)
+                if e.is_file()], default=0)
+
+
+def make_cache_key(bag_path, topic, use_sensor_time):
+    return {'bag': os.path.abspath(str(bag_path)), 'topic': topic,
+            'use_sensor_time': bool(use_sensor_time),
+            'mtime': get_bag_mtime(bag_path)}
+
+
+def load_event_cache(bag_path, topic, use_sensor_time):
+    """load_event_cache():
+    returns memory-mapped EventCache, or None if there is no cache
+    or it is stale
+    """
+    cache_dir = get_cache_dir(bag_path, topic, use_sensor_time)
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta['key'] != make_cache_key(bag_path, topic, use_sensor_time):
+        print('event cache is stale: ', cache_dir)
+        return None
+    events = np.load(os.path.join(cache_dir, 'events.npy'), mmap_mode='r')
+    msg_offsets = np.load(os.path.join(cache_dir, 'msg_offsets.npy'))
+    time_bases = np.load(os.path.join(cache_dir, 'time_bases.npy'))
+    return EventCache(events, msg_offsets, time_bases,
+                      (meta['width'], meta['height']))
+
+
+def build_event_cache(bag_path, topic, use_sensor_time):
+    """build_event_cache():
+    decodes the bag message by message straight into the memory-mapped
+    events file of the cache directory, which is sized with the bag
+    index, so memory use does not grow with the bag.
+    Returns the EventCache, or None if the bag cannot be indexed or the
+    cache cannot be written.
+    """
+    start_time = time.time()
+    key = make_cache_key(bag_path, topic, use_sensor_time)
+    index = read_bag_index(bag_path, topic)
+    if index.num_msgs == 0:
+        return None
+    cache_dir = get_cache_dir(bag_path, topic, use_sensor_time)
+    meta_file = os.path.join(cache_dir, 'meta.json')
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(meta_file):
+            os.remove(meta_file)  # old cache is invalid from here on
+        events = np.lib.format.open_memmap(
+            os.path.join(cache_dir, 'events.npy'), mode='w+', dtype=EventCD,
+            shape=(int(index.msg_offsets[-1]),))
+    except OSError as e:
+        print('cannot write event cache: ', e)
+        return None
+    msg_offsets = index.msg_offsets
+    time_bases = np.zeros(index.num_msgs, dtype=np.int64)
+    num_msgs = 0
+    for _, _, time_base, msg in bag_messages(bag_path, topic,
+                                             use_sensor_time):
+        n = len(msg.events) // 8
+        if num_msgs >= index.num_msgs or \
+                n != msg_offsets[num_msgs + 1] - msg_offsets[num_msgs]:
+            break
+        decode_into(msg.events, time_base,
+                    events[msg_offsets[num_msgs]:msg_offsets[num_msgs + 1]],
+                    ns=True)
+        time_bases[num_msgs] = time_base
+        num_msgs += 1
+    events.flush()
+    del events
+    if num_msgs != index.num_msgs:
+        print('bag does not match its index, not caching: ', cache_dir)
+        return None
+    try:
+        np.save(os.path.join(cache_dir, 'msg_offsets.npy'), msg_offsets)
+        np.save(os.path.join(cache_dir, 'time_bases.npy'), time_bases)
+        # meta data is written last, only then is the cache valid
+        with open(meta_file, 'w') as f:
+            json.dump({'key': key, 'width': index.res[0],
+                       'height': index.res[1]}, f)
+    except OSError as e:
+        print('cannot write event cache: ', e)
+        return None
+    dt = time.time() - start_time
+    print(f'took {dt:.3f}s to build event cache {cache_dir}')
+    return load_event_cache(bag_path, topic, use_sensor_time)
+
+
+def reads_to_end(bag_path, topic, skip, max_read):
+    """reads_to_end():
+    True if a read of max_read events after skip covers the rest of the
+    bag: max_read is None, or an existing bag index shows that max_read
+    is no less than the number of remaining events
+    """
+    if max_read is None:
+        return True
+    index = load_bag_index(bag_path, topic)
+    return index is not None and index.num_msgs > 0 and \
+        max_read >= index.msg_offsets[-1] - skip
+
+
+def read_event_cache(bag_path, topic, use_sensor_time, build=True):
+    """read_event_cache():
+    load the event cache, build it if needed and build is set.
+    Returns None if there is no cache.
+    """
+    cache = load_event_cache(bag_path, topic, use_sensor_time)
+    if cache is None and build:
+        cache = build_event_cache(bag_path, topic, use_sensor_time)
+    return cache
+
+
+class BagIndex():
+    """Per-message index of the events of one topic in a bag.
+
+    For every message (in bag order) it keeps the sqlite row id and the
+    number of the .db3 file holding it, the receive time stamp, the
+    cumulative event count (msg_offsets, one longer than the number of
+    messages) and the sensor time stamps of the first and last event.
+    """
+
+    fields = ('row_id', 'file_idx', 't_rec', 'msg_offsets',
+              't_first', 't_last')
+
+    def __init__(self, arrays, res):
+        for f in self.fields:
+            setattr(self, f, arrays[f])
+        self.res = res
+        self.num_msgs = self.t_rec.shape[0]
+
+    def message_for_event(self, n):
+        """message_for_event(): ordinal of message that holds event n"""
+        return int(min(max(np.searchsorted(
+            self.msg_offsets, n, side='right') - 1, 0),
+            max(self.num_msgs - 1, 0)))
+
+    def message_for_time(self, t):
+        """message_for_time():
+        ordinal of the first message with events at sensor time >= t [ns],
+        num_msgs if there is none
+        """
+        return int(np.searchsorted(np.maximum.accumulate(self.t_last), t,
+                                   side='left'))
+
+
+def get_index_dir(bag_path, topic):
+    """get_index_dir(): the index lives next to the event cache"""
+    return os.path.join(os.path.dirname(get_cache_dir(bag_path, topic, True)),
+                        topic.strip('/').replace('/', '_') + '_index')
+
+
+def get_db_files(bag_path):
+    bag_path = str(bag_path)
+    if not os.path.isdir(bag_path):
+        return [bag_path]
+    names = [f for f in os.listdir(bag_path) if f.endswith('.db3')]
+    # split bags are numbered foo_0.db3, foo_1.db3, ..., foo_10.db3
+    return [os.path.join(bag_path, f) for f in sorted(
+        names, key=lambda f: (len(f), f))]
+
+
+def load_bag_index(bag_path, topic):
+    """load_bag_index(): returns BagIndex, or None if missing or stale"""
+    index_dir = get_index_dir(bag_path, topic)
+    try:
+        with open(os.path.join(index_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta['key'] != make_cache_key(bag_path, topic, True):
+        print('bag index is stale: ', index_dir)
+        return None
+    with np.load(os.path.join(index_dir, 'index.npz')) as arrays:
+        return BagIndex(arrays, (meta['width'], meta['height']))
+
+
+def build_bag_index(bag_path, topic):
+    """build_bag_index():
+    reads all messages of the topic straight from the sqlite database
+    (to get the row ids), and writes the index next to the event cache
+    """
+    start_time = time.time()
+    key = make_cache_key(bag_path, topic, True)
+    res = (0, 0)
+    cols = {f: [] for f in BagIndex.fields}
+    cols['msg_offsets'].append(0)
+    for file_idx, db_file in enumerate(get_db_files(bag_path)):
+        con = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)
+        try:
+            row = con.execute('SELECT id, type FROM topics WHERE name = ?',
+                              (topic,)).fetchone()
+        except sqlite3.DatabaseError:
+            row = None  # not a rosbag2 database, cannot index
+        if row is None:
+            con.close()
+            continue
+        msg_type = get_message(row[1])
+        for row_id, t_rec, data in con.execute(
+                'SELECT id, timestamp, data FROM messages WHERE topic_id = ?'
+                ' ORDER BY timestamp, id', (row[0],)):
+            msg = deserialize_message(data, msg_type)
+            res = (int(msg.width), int(msg.height))
+            _, t = unpack_words(msg.events)
+            cols['row_id'].append(row_id)
+            cols['file_idx'].append(file_idx)
+            cols['t_rec'].append(t_rec)
+            cols['msg_offsets'].append(cols['msg_offsets'][-1] + t.shape[0])
+            cols['t_first'].append(msg.time_base + int(t[0] if t.shape[0]
+                                                       else 0))
+            cols['t_last'].append(msg.time_base + int(t[-1] if t.shape[0]
+                                                      else 0))
+        con.close()
+    arrays = {f: np.array(cols[f], dtype=np.int64) for f in BagIndex.fields}
+    index = BagIndex(arrays, res)
+    index_dir = get_index_dir(bag_path, topic)
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        np.savez(os.path.join(index_dir, 'index.npz'), **arrays)
+        with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+            json.dump({'key': key, 'width': res[0], 'height': res[1]}, f)
+    except OSError as e:
+        print('cannot write bag index: ', e)
+    dt = time.time() - start_time
+    print(f'took {dt:.3f}s to build index for {index.num_msgs} msgs')
+    return index
+
+
+def read_bag_index(bag_path, topic):
+    """read_bag_index(): load the bag index, build it if needed"""
+    index = load_bag_index(bag_path, topic)
+    if index is None:
+        index = build_bag_index(bag_path, topic)
+    return index
+
+
+def message_offsets(bag_path, topic, cache=None):
+    """message_offsets():
+    cumulative event count per message, from the event cache if given,
+    otherwise from the bag index
+    """
+    if cache is not None:
+        return cache.msg_offsets
+    return read_bag_index(bag_path, topic).msg_offsets
+
+
+def bag_messages(bag_path, topic, use_sensor_time, start_msg=0):
+    """bag_messages():
+    yields (width, height, time_base, msg) from the bag, starting at
+    message number start_msg (located with the bag index)
+    """
+    bag = PrefetchBagReader(bag_path, topic)
+    if start_msg > 0:
+        index = read_bag_index(bag_path, topic)
+        if start_msg >= index.num_msgs:
+            return
+        # seek lands on the first message with the same receive time
+        t_rec = index.t_rec[start_msg]
+        bag.seek(int(t_rec))
+        for i in range(np.searchsorted(index.t_rec, t_rec), start_msg):
+            bag.skip_next()
+    try:
+        while bag.has_next():
+            _, msg, t_rec = bag.read_next()
+            time_base = msg.time_base if use_sensor_time else \
+                Time.from_msg(msg.header.stamp).nanoseconds
+            yield msg.width, msg.height, time_base, msg
+    finally:
+        bag.close()  # the caller may stop early, e.g. at max_read
+
+
+def read_messages(bag_path, topic, use_sensor_time, converter,
+                  cache=None, start_msg=0):
+    """read_messages():
+    generator that yields (width, height, time_base, events) for each
+    message, beginning with message number start_msg, where events is
+    whatever the converter produces. If an event cache is given and the
+    converter supports it, the events are taken from the cache instead
+    of the bag.
+    """
+    if cache is not None and hasattr(converter, 'convert_events'):
+        for width, height, time_base, evs in cache.messages(start_msg):
+            yield width, height, time_base, converter.convert_events(evs)
+        return
+    for _, _, time_base, msg in bag_messages(bag_path, topic,
+                                             use_sensor_time, start_msg):
+        width, height, evs = converter.convert(msg, time_base)
+        yield width, height, time_base, evs
+
+
+class PixelEventStore():
+    """Events grouped by pixel in compressed sparse row (CSR) layout.
+
+    Time stamps (int64) and polarities (int8) live in two contiguous
+    arrays, sorted by pixel index, so an event takes 9 bytes. The events
+    of pixel i are at offsets[i]:offsets[i + 1]. t(i) and p(i) return
+    zero-copy views, indexing with [pixel] returns an (n, 2) array with
+    timestamp and polarity columns like the per-pixel arrays of
+    read_as_array(). on_counts holds the number of ON events per pixel.
+    """
+
+    def __init__(self, t, p, offsets, on_counts):
+        self.t_all = t
+        self.p_all = p
+        self.offsets = offsets
+        self.on_counts = on_counts
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def t(self, pixel):
+        return self.t_all[self.offsets[pixel]:self.offsets[pixel + 1]]
+
+    def p(self, pixel):
+        return self.p_all[self.offsets[pixel]:self.offsets[pixel + 1]]
+
+    def __getitem__(self, pixel):
+        return np.column_stack((self.t(pixel), self.p(pixel)))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def counts(self, polarity=None):
+        """counts(): number of events per pixel, or only of the
+        ON (polarity=1) or OFF (polarity=0) events"""
+        counts = np.diff(self.offsets)
+        if polarity is None:
+            return counts
+        return self.on_counts if polarity else counts - self.on_counts
+
+    def active_pixels(self):
+        """active_pixels(): indices of pixels that have events"""
+        return np.flatnonzero(self.counts())
+
+    def top_pixels(self, k=10, polarity=None):
+        """top_pixels(): the k pixels with the most events, see top_pixels()"""
+        return top_pixels(self.counts(polarity), k)
+
+
+def group_by_pixel(t, p, idx, num_pixels):
+    """group_by_pixel():
+    sorts events by pixel index (stable, so time order is preserved
+    within each pixel) and returns them as PixelEventStore
+    """
+    order = np.argsort(idx, kind='stable')
+    offset_type = np.int32 if t.shape[0] < 2**31 else np.int64
+    offsets = np.zeros(num_pixels + 1, dtype=offset_type)
+    np.cumsum(np.bincount(idx, minlength=num_pixels), out=offsets[1:])
+    on_counts = np.bincount(idx[p != 0], minlength=num_pixels)
+    return PixelEventStore(t[order].astype(np.int64),
+                           p[order].astype(np.int8), offsets, on_counts)
+
+
+def top_pixels(counts, k=10):
+    """top_pixels():
+    returns (pixels, counts) of the (up to) k pixels with the most events,
+    most active first. Pixels without events are never returned.
+    """
+    k = min(k, np.count_nonzero(counts))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=counts.dtype)
+    top = np.argpartition(-counts, k - 1)[:k]
+    top = top[np.lexsort((top, -counts[top]))]  # ties: lower pixel first
+    return top, counts[top]
+
+
+def pixel_histogram(bag_path, topic, use_sensor_time=True, skip=0,
+                    max_read=None, use_cache=True):
+    """pixel_histogram():
+    counts the events per pixel in one streaming pass over the bag,
+    without keeping the events.
+    returns tuple with:
+    - array of shape (2, width * height) with the OFF and ON counts
+    - sensor resolution
+    """
+    counts = None
+    res = (0, 0)
+    for width, height, _, evs in iter_events(
+            bag_path, topic, use_sensor_time, skip=skip, max_read=max_read,
+            use_cache=use_cache):
+        if counts is None:
+            res = (int(width), int(height))
+            counts = np.zeros((2, res[0] * res[1]), dtype=np.int64)
+        idx = evs['x'].astype(np.int64) + evs['y'].astype(np.int64) * res[0]
+        counts += np.bincount(
+            2 * idx + (evs['p'] != 0), minlength=2 * counts.shape[1]
+        ).reshape(-1, 2).T
+    if counts is None:
+        counts = np.zeros((2, 0), dtype=np.int64)
+    return counts, res
+
+
+def clip_message(n, num_seen, num_events, skip, max_read):
+    """clip_message():
+    range of events to keep from a message with n events, given the
+    number of events seen so far and the number of events kept so far
+    """
+    start_idx = max(0, min(skip - num_seen, n))
+    end_idx = n if max_read is None else \
+        min(start_idx + max_read - num_events, n)
+    return start_idx, end_idx
+
+
+def find_start_message(offsets, skip):
+    """find_start_message():
+    returns number of the message that holds event skip, and the number
+    of events before that message. Skipping past the end still returns
+    the last message so the caller learns the sensor resolution.
+    """
+    start_msg = min(max(np.searchsorted(offsets, skip, side='right') - 1, 0),
+                    max(offsets.shape[0] - 2, 0))
+    return int(start_msg), int(offsets[start_msg])
+
+
 def read_bag(bag_path, topic, use_sensor_time=False,
-             converter=EventCDConverter(), skip=0, max_read=None):
-    bag = BagReader(bag_path, topic)
+             converter=EventCDConverter(), skip=0, max_read=None,
+             use_cache=True, as_list=True):
+    """read_bag():
+    returns tuple with:
+    - list of per-message event arrays or, with as_list=False,
+      one array with all events
+    - sensor resolution
+    - time offset
+    - number of events and messages read
+    Converters that support it (EventCDConverter) decode straight into
+    one preallocated array, the per-message arrays are views into it.
+    """
+    if not hasattr(converter, 'convert_into'):
+        return read_bag_list(bag_path, topic, use_sensor_time, converter,
+                             skip, max_read, use_cache, as_list)
+    start_time = time.time()
+    num_events = 0
+    num_msgs = 0
+
+    # bounded reads only use an existing cache, they never build one
+    cache = read_event_cache(
+        bag_path, topic, use_sensor_time,
+        build=reads_to_end(bag_path, topic, skip, max_read)) \
+        if use_cache else None
+    if cache is not None:
+        msg_offsets = cache.msg_offsets
+    else:
+        # building the index is a full pass over the bag, so a short read
+        # from the start only uses an existing one
+        index = load_bag_index(bag_path, topic)
+        if index is None and (skip > 0 or max_read is None):
+            index = build_bag_index(bag_path, topic)
+        msg_offsets = index.msg_offsets if index is not None else None
+    start_msg, num_seen = 0, 0
+    if skip > 0:
+        start_msg, num_seen = find_start_message(msg_offsets, skip)
+    # size the buffer up front if the event counts are known, otherwise
+    # it grows by doubling
+    capacity = 0 if msg_offsets is None else \
+        max(int(msg_offsets[-1]) - skip, 0)
+    if max_read is not None and msg_offsets is not None:
+        capacity = min(capacity, max_read)
+    buf = EventBuffer(capacity)
+    msg_ends = []
+    offset = 0
+    width, height = 0, 0
+    messages = cache.messages(start_msg) if cache is not None else \
+        bag_messages(bag_path, topic, use_sensor_time, start_msg)
+    for width, height, time_base, src in messages:
+        offset = converter.offset(time_base)
+        n = src.shape[0] if cache is not None else len(src.events) // 8
+        start_idx, end_idx = clip_message(n, num_seen, num_events, skip,
+                                          max_read)
+        num_seen += n
+        k = max(end_idx - start_idx, 0)
+        out = buf.reserve(k)
+        if cache is not None:
+            converter.convert_events(src[start_idx:end_idx], out=out)
+        elif k == n:
+            converter.convert_into(src, time_base, out, 0)
+        else:  # partial message at the beginning or end of the read
+            out[:] = converter.convert(src, time_base)[2][start_idx:end_idx]
+        buf.size += k
+        msg_ends.append(buf.size)
+        num_events += end_idx - start_idx
+        num_msgs += 1
+        if end_idx < n:
+            break
+
+    events = buf.array()
+    if as_list:
+        events = [events[s:e] for s, e in zip([0] + msg_ends[:-1], msg_ends)]
+    dt = time.time() - start_time
+    print(f'took {dt:2f}s to process {num_msgs}, rate: {num_msgs / dt} ' +
+          f'msgs/s, {num_events * 1e-6 / dt} Mev/s')
+    return events, (width, height), offset, num_events, num_msgs
+
+
+def read_bag_list(bag_path, topic, use_sensor_time=False,
+                  converter=EventCDConverter(), skip=0, max_read=None,
+                  use_cache=True, as_list=True):
+    """read_bag_list(): read_bag() for converters without convert_into()"""
     start_time = time.time()
     num_events = 0
     num_msgs = 0
 
     events = []
     offset = 0
-    while bag.has_next():
-        topic, msg, t_rec = bag.read_next()
-        time_base = msg.time_base if use_sensor_time else \
-            Time().from_msg(msg.header.stamp).nanoseconds
+    cache = read_event_cache(
+        bag_path, topic, use_sensor_time,
+        build=reads_to_end(bag_path, topic, skip, max_read)) \
+        if use_cache else None
+    start_msg, num_seen = 0, 0
+    if skip > 0:
+        start_msg, num_seen = find_start_message(message_offsets(
+            bag_path, topic, cache), skip)
+    for width, height, time_base, evs in read_messages(
+            bag_path, topic, use_sensor_time, converter, cache, start_msg):
         offset = converter.offset(time_base)
-        width, height, evs = converter.convert(msg, time_base)
-        start_idx = max(0, min(skip - num_events, evs.shape[0]))
-        end_idx = evs.shape[0] if max_read is None else \
-            min(max_read - num_events, evs.shape[0])
+        start_idx, end_idx = clip_message(evs.shape[0], num_seen, num_events,
+                                          skip, max_read)
+        num_seen += evs.shape[0]
         events.append(evs[start_idx:end_idx])
         num_events += end_idx - start_idx
         num_msgs += 1
         if end_idx < evs.shape[0]:
             break
 
+    if not as_list:
+        events = merge_array_list(events, num_events, dtype=events[0].dtype)
     dt = time.time() - start_time
     print(f'took {dt:2f}s to process {num_msgs}, rate: {num_msgs / dt} ' +
           f'msgs/s, {num_events * 1e-6 / dt} Mev/s')
     return events, (width, height), offset, num_events, num_msgs
 
 
-def read_as_list(fname, topic, use_sensor_time=True, skip=0, max_read=None):
+def split_messages(msg_offsets, start_msg, end_msg, num_shards):
+    """split_messages():
+    cuts messages [start_msg, end_msg) into up to num_shards contiguous
+    ranges with about the same number of events each.
+    returns array with the shard boundaries (message numbers)
+    """
+    targets = np.linspace(msg_offsets[start_msg], msg_offsets[end_msg],
+                          num_shards + 1)
+    bounds = np.searchsorted(msg_offsets, targets[1:-1], side='right') - 1
+    bounds = np.clip(bounds, start_msg, end_msg)
+    return np.unique(np.concatenate(([start_msg], bounds, [end_msg])))
+
+
+def decode_shard(bag_path, topic, use_sensor_time, converter, fname,
+                 num_total, msg_offsets, start_msg, end_msg, skip):
+    """decode_shard():
+    worker that decodes messages [start_msg, end_msg) into the memory
+    mapped .npy file fname, which holds the events [skip, skip + num_total)
+    of the whole bag. msg_offsets are the cumulative event counts of the
+    shard's messages (end_msg - start_msg + 1 entries).
+    returns the time offset of the last message of the shard
+    """
+    events = np.load(fname, mmap_mode='r+')
+    offset = 0
+    for i, (_, _, time_base, msg) in enumerate(bag_messages(
+            bag_path, topic, use_sensor_time, start_msg)):
+        if i == end_msg - start_msg:
+            break
+        offset = converter.offset(time_base)
+        n = len(msg.events) // 8
+        # clip the message to the events [skip, skip + num_total)
+        start_idx = max(skip - msg_offsets[i], 0)
+        end_idx = min(skip + num_total - msg_offsets[i], n)
+        if end_idx <= start_idx:
+            continue
+        out = events[msg_offsets[i] + start_idx - skip:
+                     msg_offsets[i] + end_idx - skip]
+        if end_idx - start_idx == n:
+            converter.convert_into(msg, time_base, out, 0)
+        else:
+            out[:] = converter.convert(msg, time_base)[2][
+                start_idx:end_idx]
+    events.flush()
+    return offset
+
+
+def read_bag_parallel(bag_path, topic, use_sensor_time=False,
+                      converter=EventCDConverter(), skip=0, max_read=None,
+                      as_list=True, num_workers=None):
+    """read_bag_parallel():
+    same as read_bag() (without the event cache), but splits the bag
+    into message ranges with about equal event counts using the bag
+    index, and decodes each range in a separate process into one memory
+    mapped temporary file, which backs the returned events (no copy).
+    The converter must support convert_into().
+    returns same tuple as read_bag()
+    """
+    start_time = time.time()
+    index = read_bag_index(bag_path, topic)
+    msg_offsets = index.msg_offsets
+    total = int(msg_offsets[-1])
+    skip = min(max(skip, 0), total)
+    num_total = total - skip if max_read is None else \
+        min(max_read, total - skip)
+    if num_total <= 0 or not hasattr(converter, 'convert_into'):
+        return read_bag(bag_path, topic, use_sensor_time, converter, skip,
+                        max_read, use_cache=False, as_list=as_list)
+    start_msg = index.message_for_event(skip)
+    end_msg = int(np.searchsorted(msg_offsets, skip + num_total,
+                                  side='left'))
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    bounds = split_messages(msg_offsets, start_msg, end_msg, num_workers)
+
+    fd, fname = tempfile.mkstemp(prefix='read_bag_', suffix='.npy')
+    os.close(fd)
+    try:
+        events = np.lib.format.open_memmap(fname, mode='w+', dtype=EventCD,
+                                           shape=(num_total,))
+        with ProcessPoolExecutor(max_workers=len(bounds) - 1) as pool:
+            futures = [pool.submit(
+                decode_shard, bag_path, topic, use_sensor_time, converter,
+                fname, num_total, msg_offsets[s:e + 1], s, e, skip)
+                for s, e in zip(bounds[:-1], bounds[1:])]
+            offset = [f.result() for f in futures][-1]
+    finally:
+        os.remove(fname)  # the memory map keeps the data alive
+    events = events.view(np.ndarray)
+
+    num_msgs = end_msg - start_msg
+    if as_list:
+        ends = np.clip(msg_offsets[start_msg + 1:end_msg + 1] - skip,
+                       0, num_total)
+        events = [events[s:e] for s, e in zip(
+            np.concatenate(([0], ends[:-1])), ends)]
+    dt = time.time() - start_time
+    print(f'took {dt:2f}s to process {num_msgs}, rate: {num_msgs / dt} ' +
+          f'msgs/s, {num_total * 1e-6 / dt} Mev/s')
+    return events, index.res, offset, num_total, num_msgs
+
+
+def find_skip_message(fname, topic, cache, skip):
+    """find_skip_message():
+    read_as_list() skips whole messages until the number of skipped bytes
+    (8 per event) reaches skip. Returns the first message that is not
+    skipped and the number of bytes skipped before it.
+    """
+    if skip <= 0:
+        return 0, 0
+    offsets = 8 * message_offsets(fname, topic, cache)
+    start_msg = int(min(np.searchsorted(offsets, skip, side='left'),
+                        max(offsets.shape[0] - 2, 0)))
+    return start_msg, int(offsets[start_msg])
+
+
+def read_as_list(fname, topic, use_sensor_time=True, skip=0, max_read=None,
+                 use_cache=True):
     """read_as_list():
     returns tuple with:
-    - 2d list (in row major order) of lists with timestamps
-      and polarities as tuples
+    - PixelEventStore (in row major order) with timestamps and
+      polarities. It used to be a list of lists of (t, p) tuples;
+      indexing by pixel now gives an (n, 2) array instead.
+    - sensor resolution
+    """
+    return read_as_columns(fname, topic, use_sensor_time, skip, max_read,
+                           use_cache)
+
+
+def read_as_columns(fname, topic, use_sensor_time=True, skip=0,
+                    max_read=None, use_cache=True):
+    """read_as_columns():
+    decodes each message in one go and groups the events by pixel with
+    a single sort at the end.
+    returns tuple with:
+    - PixelEventStore (in row major order) with timestamps and polarities
     - sensor resolution
     """
     print('reading bag: ', fname)
     print('topic: ', topic)
     print('using sensor time: ', use_sensor_time)
     event_count = [0, 0]
+    cache = read_event_cache(
+        fname, topic, use_sensor_time,
+        build=reads_to_end(fname, topic, skip // 8, max_read)) \
+        if use_cache else None
     if max_read is None:
         max_read = sys.maxsize
-    bag = BagReader(fname, topic)
     t0 = time.time()
 
-    data, res = None, None
-    cnt, skipped = 0, 0
+    res = None
+    cnt = 0
+    t_list = [np.empty(0, dtype=np.uint64)]
+    p_list = [np.empty(0, dtype=np.uint16)]
+    idx_list = [np.empty(0, dtype=np.uint32)]
 
-    while bag.has_next():
-        topic, msg, t_rec = bag.read_next()
-        if data is None:
-            res = (int(msg.width), int(msg.height))
-            data = [[] for i in range(res[0] * res[1])]
+    # skip counts bytes (8 per event) of whole messages, and reading
+    # stops after the message that takes the count past max_read
+    start_msg, skipped = find_skip_message(fname, topic, cache, skip)
+    for width, height, _, (t, x, y, p) in read_messages(
+            fname, topic, use_sensor_time, PacketConverter(), cache,
+            start_msg):
+        if res is None:
+            res = (int(width), int(height))
         if skipped < skip:
-            skipped += len(msg.events)
+            skipped += t.shape[0] * 8  # size of message in bytes
             continue
-        time_base = msg.time_base if use_sensor_time else \
-            Time.from_msg(msg.header.stamp).nanoseconds
-        t, x, y, p = decode_packet(msg.events, time_base)
         # convert to uint32 to avoid uint16 arithmetic!
         idx = y.astype(np.uint32) * res[0] + x.astype(np.uint32)
         cnt += p.shape[0]
         num_on = np.count_nonzero(p)
         event_count[0] += p.shape[0] - num_on
         event_count[1] += num_on
-        for i in range(t.shape[0]):
-            data[idx[i]].append((t[i], p[i]))
-            
+        t_list.append(t)
+        p_list.append(p)
+        idx_list.append(idx)
         if cnt > max_read:
             break
+    if res is None:
+        return None, None
     t1 = time.time()
-    dt = t1 - t0
+    data = group_by_pixel(np.concatenate(t_list), np.concatenate(p_list),
+                          np.concatenate(idx_list), res[0] * res[1])
+    dt = time.time() - t0
     print(f'took {dt:.3f}s to read {cnt} events ({cnt * 1e-6 / dt:.3f} Mevs)',
           f' @ resolution: {res}\n',
           f'# of OFF: {event_count[0]:8d}\n # of ON:  {event_count[1]:8d}')
-
+    print(f'took {time.time() - t1:.3f}s to group events by pixel')
     return data, res
 
 
 def read_as_array(bag_path, topic, use_sensor_time=True,
-                  skip=0, max_read=None):
+                  skip=0, max_read=None, columnar=True, use_cache=True):
     """read_as_array():
     returns tuple with:
     - 2d list (in row major order) of numpy arrays with timestamps
-      and polarities as columns
+      and polarities as columns. With columnar=True (the default) this
+      is a PixelEventStore that can be indexed the same way.
     - sensor resolution
     """
-    data, res = read_as_list(bag_path, topic, use_sensor_time, skip, max_read)
-    if data is not None:
-        t0 = time.time()
-        # turn the data in each x, y cell into numpy array
-        data_array = [np.array(d) for d in data]
-        dt = time.time() - t0
-        print(f'took {dt:.3f}s to convert to numpy arrays!')
-        return data_array, res
-    return [], (0, 0)
+    data, res = read_as_columns(bag_path, topic, use_sensor_time, skip,
+                                max_read, use_cache)
+    if data is None:
+        return [], (0, 0)
+    if columnar:
+        return data, res
+    t0 = time.time()
+    # copy the events of each x, y cell into its own numpy array
+    data_array = list(data)
+    dt = time.time() - t0
+    print(f'took {dt:.3f}s to convert to numpy arrays!')
+    return data_array, res
 
 
 def merge_array_list(array_list, num_events, dtype):
@@ -219,32 +1100,175 @@ def merge_array_list(array_list, num_events, dtype):
     return events
 
 
+def make_pixel_mask(pixel_list, res):
+    """make_pixel_mask(): boolean lookup table over all sensor pixels"""
+    mask = np.zeros(res[0] * res[1], dtype=bool)
+    mask[np.asarray(pixel_list, dtype=np.int64)] = True
+    return mask
+
+
 def read_events_for_pixels(bag_path, pixel_list, topic,
-                           use_sensor_time=True, skip=0, max_read=None):
+                           use_sensor_time=True, skip=0, max_read=None,
+                           use_cache=True, converter=EventCDConverter()):
+    """read_events_for_pixels():
+    streams through the bag and keeps only the events of the requested
+    pixels, so memory scales with the selected events, not the bag.
+    skip and max_read count all events, same as read_bag().
+    With use_cache set, an existing event cache is read instead of the
+    bag. The cache is never built here. Time stamps are in usec, or in
+    nsec with converter=NanosecondConverter().
+    returns tuple with:
+    - PixelEventStore (in row major order) with timestamps and
+      polarities, empty for all but the requested pixels
+    - sensor resolution
+    """
     start_time = time.time()
-    array_list, res, _, num_events, num_msgs = read_bag(
-        bag_path, topic, use_sensor_time, EventCDConverter(), skip, max_read)
+    num_events, num_msgs, num_selected = 0, 0, 0
+    mask = None
+    selected = []
+    # pixel selection only uses an existing cache, it never builds one
+    cache = read_event_cache(bag_path, topic, use_sensor_time, build=False) \
+        if use_cache else None
+    start_msg, num_seen = 0, 0
+    if skip > 0:
+        start_msg, num_seen = find_start_message(message_offsets(
+            bag_path, topic, cache), skip)
+    for width, height, _, evs in read_messages(
+            bag_path, topic, use_sensor_time, converter, cache,
+            start_msg):
+        if mask is None:
+            res = (int(width), int(height))
+            mask = make_pixel_mask(pixel_list, res)
+        start_idx, end_idx = clip_message(evs.shape[0], num_seen, num_events,
+                                          skip, max_read)
+        num_seen += evs.shape[0]
+        ev = evs[start_idx:end_idx]
+        idx = ev['x'].astype(np.uint32) + ev['y'].astype(np.uint32) * res[0]
+        keep = ev[mask[idx]]
+        selected.append(keep)
+        num_selected += keep.shape[0]
+        num_events += end_idx - start_idx
+        num_msgs += 1
+        if end_idx < evs.shape[0]:
+            break
 
-    events = merge_array_list(array_list, num_events, dtype=EventCD)
+    events = merge_array_list(selected, num_selected, dtype=EventCD)
 
-    # create empty list
-    data = [[] for i in range(res[0] * res[1])]
-    # fill only for requested pixel indexes
+    # sort the (few) selected events by pixel
     idx = events['x'].astype(np.uint32) \
         + events['y'].astype(np.uint32) * res[0]
-
-    for pixel in pixel_list:
-        match_idx = idx == pixel
-        if np.count_nonzero(match_idx) > 0:
-            data[pixel] = np.column_stack(
-                (events['t'][match_idx], events['p'][match_idx]))
+    data = group_by_pixel(events['t'], events['p'], idx, res[0] * res[1])
 
     dt = time.time() - start_time
-    print(f'events: {events.shape[0]} in {num_msgs / dt} msgs/s, ' +
-          f'{num_events * 1e-6 / dt} Mev/s')
+    print(f'events: {num_events} (selected: {num_selected}) in ' +
+          f'{num_msgs / dt} msgs/s, {num_events * 1e-6 / dt} Mev/s')
     return data, res
 
 
+def make_roi_mask(roi, res):
+    """make_roi_mask(): lookup table for the pixels in roi (x0, y0, x1, y1),
+    upper bounds exclusive"""
+    mask = np.zeros((res[1], res[0]), dtype=bool)
+    mask[roi[1]:roi[3], roi[0]:roi[2]] = True
+    return mask.reshape(-1)
+
+
+def concat_chunk(parts, dtype):
+    """concat_chunk(): join pending parts, without copying a single part"""
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+
+def iter_events(bag_path, topic, use_sensor_time=False,
+                converter=EventCDConverter(), chunk_size=None,
+                time_window=None, pixel_list=None, roi=None, skip=0,
+                max_read=None, use_cache=True, start_time=None):
+    """iter_events():
+    generator over the events of a bag that holds no more than one chunk
+    (plus one message) in memory at a time. Yields tuples
+    (width, height, offset, events) with events as produced by the
+    converter (EventCD for the default converter), in chunks of:
+    - chunk_size events (the last one may be shorter), or
+    - time_window (in units of the converter's time stamps, usec for
+      EventCDConverter). Windows without events are yielded empty,
+    - otherwise one chunk per message.
+    use_sensor_time and the converter select the time base.
+    pixel_list (row major pixel numbers) and roi (x0, y0, x1, y1) keep
+    only the events of those pixels. Both restrict the stream if given.
+    skip and max_read count all events before filtering, like read_bag().
+    start_time (sensor time in nsec) starts the stream at the first
+    message with events at or after that time, found with the bag index.
+    Events of earlier messages count as skipped.
+    With use_cache set, an existing event cache is read instead of the
+    bag. The cache is never built here, since that needs the whole bag.
+    """
+    # streaming only uses an existing cache, it never builds one
+    cache = read_event_cache(bag_path, topic, use_sensor_time, build=False) \
+        if use_cache else None
+    start_msg, num_seen = 0, 0
+    if skip > 0:
+        start_msg, num_seen = find_start_message(message_offsets(
+            bag_path, topic, cache), skip)
+    if start_time is not None:
+        index = read_bag_index(bag_path, topic)
+        time_msg = index.message_for_time(start_time)
+        if time_msg > start_msg:
+            start_msg, num_seen = time_msg, int(index.msg_offsets[time_msg])
+    num_events = 0
+    mask = None
+    parts, num_parts, t_end = [], 0, None
+    width, height, offset, dtype = 0, 0, 0, None
+    for width, height, time_base, evs in read_messages(
+            bag_path, topic, use_sensor_time, converter, cache, start_msg):
+        offset = converter.offset(time_base)
+        dtype = evs.dtype
+        start_idx, end_idx = clip_message(evs.shape[0], num_seen, num_events,
+                                          skip, max_read)
+        num_seen += evs.shape[0]
+        num_events += max(end_idx - start_idx, 0)
+        done = end_idx < evs.shape[0]
+        evs = evs[start_idx:end_idx]
+        if mask is None and (pixel_list is not None or roi is not None):
+            res = (int(width), int(height))
+            mask = np.ones(res[0] * res[1], dtype=bool)
+            if pixel_list is not None:
+                mask &= make_pixel_mask(pixel_list, res)
+            if roi is not None:
+                mask &= make_roi_mask(roi, res)
+        if mask is not None:
+            idx = evs['x'].astype(np.uint32) \
+                + evs['y'].astype(np.uint32) * width
+            evs = evs[mask[idx]]
+        if chunk_size is not None:
+            while evs.shape[0] > 0:
+                k = min(chunk_size - num_parts, evs.shape[0])
+                parts.append(evs[:k])
+                num_parts += k
+                evs = evs[k:]
+                if num_parts == chunk_size:
+                    yield width, height, offset, concat_chunk(parts, dtype)
+                    parts, num_parts = [], 0
+        elif time_window is not None:
+            if t_end is None and evs.shape[0] > 0:
+                t_end = evs['t'][0] + time_window
+            while evs.shape[0] > 0:
+                k = np.searchsorted(evs['t'], t_end, side='left')
+                parts.append(evs[:k])
+                evs = evs[k:]
+                if evs.shape[0] == 0:
+                    break
+                yield width, height, offset, concat_chunk(parts, dtype)
+                parts = []
+                t_end += time_window
+        else:
+            yield width, height, offset, evs
+        if done:
+            break
+    if parts and sum(p.shape[0] for p in parts) > 0:
+        yield width, height, offset, concat_chunk(parts, dtype)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='read and decode events from bag.')
@@ -252,9 +1276,28 @@ if __name__ == '__main__':
                         required=True, help='bag file to read events from')
     parser.add_argument('--topic', help='Event topic to read',
                         default='/event_camera/events', type=str)
+    parser.add_argument('--workers', '-w', help='number of decoding processes',
+                        default=1, type=int)
+    parser.add_argument('--top_pixels', help='print the N most active pixels',
+                        default=0, type=int)
     args = parser.parse_args()
 
-    events, res, _, _, _ = read_bag(args.bag, args.topic)
+    if args.top_pixels > 0:
+        counts, res = pixel_histogram(args.bag, args.topic)
+        for name, c in (('all', counts.sum(axis=0)), ('OFF', counts[0]),
+                        ('ON', counts[1])):
+            pixels, num = top_pixels(c, args.top_pixels)
+            print(f'top {name} pixels (x, y, pixel, count):')
+            for pix, n in zip(pixels, num):
+                print(f'  {pix % res[0]:5d} {pix // res[0]:5d} '
+                      f'{pix:8d} {n:10d}')
+        sys.exit(0)
+
+    if args.workers > 1:
+        events, res, _, _, _ = read_bag_parallel(args.bag, args.topic,
+                                                 num_workers=args.workers)
+    else:
+        events, res, _, _, _ = read_bag(args.bag, args.topic)
 
     if len(events) > 0:
         print('test printout:\n', events[0])
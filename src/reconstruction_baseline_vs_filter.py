@@ -19,7 +19,7 @@
 import matplotlib.pyplot as plt
 import argparse
 import numpy as np
-import read_bag_ros2
+import graph_loader
 import yaml
 import core_filtering
 
@@ -58,78 +58,6 @@ def set_font_size(axs, fontsize):
         set_tick_font_size(ax, fontsize)
 
 
-def find_periods_baseline(data, L, T):
-    last_t = [None, None]
-    last_p = None
-    period = [[], []]
-    times = [[], []]
-    cnt = int(0)
-    period_omit = 2 * int(round(T))
-    for i, d in enumerate(data):
-        t = d[0]
-        p = d[1]
-        if last_p is not None and last_p != p:
-            if p:
-                if last_t[0] is not None and cnt > period_omit:
-                    period[0].append(t - last_t[0])
-                    times[0].append((t, last_t[0], 1e9 * L[i]))
-                last_t[0] = t
-            else:
-                if last_t[1] is not None and cnt > period_omit:
-                    period[1].append(t - last_t[1])
-                    times[1].append((t, last_t[1], 1e9 * L[i]))
-                last_t[1] = t
-        last_p = p
-        cnt += 1
-    return 1e-9 * np.array(times[0]), 1e-9 * np.array(period[0]), \
-        1e-9 * np.array(times[1]), 1e-9 * np.array(period[1])
-
-
-def reconstruct(data, T):
-    alpha = core_filtering.compute_alpha_for_cutoff(T)
-    beta  = core_filtering.compute_beta_for_cutoff(T)
-    dL = np.where(data[:, 1] == 0, -1, 1)
-    return  core_filtering.filter_iir(dL, alpha, beta, (0, 0))
-
-
-def find_periods_filtered(data, L_all, T):
-    t_all = data[:, 0]
-
-    # drop the first 2 * cutoff period
-    period_omit = 2 * int(round(T))
-    t_prev, L_prev = None, None
-    t_flip, t_flip_interp = [], []
-    dt, dt_interp = [], []
-    upper_half = False
-    cnt = 0
-    for t, L in zip(t_all, L_all):
-        if upper_half and L < 0:
-            if cnt > period_omit:
-                # regular periods
-                if t_flip: # has element
-                    dt.append(t - t_flip[-1][0])
-                    t_flip.append((t, t_flip[-1][0], L * 1e9))
-                else:
-                    t_flip.append((t, t, L * 1e9))
-                # ------ interpolated periods
-                if L_prev:
-                    dt_int = t - t_prev
-                    dL_int = L - L_prev
-                    t_interp = t_prev - dt_int * L_prev / dL_int
-                    if t_flip_interp:
-                        dt_interp.append(t_interp - t_flip_interp[-1][0])
-                        t_flip_interp.append((t_interp, t_flip_interp[-1][0], 0))
-                    else:
-                        t_flip_interp.append((t_interp, t_interp, 0))
-        upper_half = L > 0
-        t_prev = t  # for interpolation
-        L_prev = L  # for interpolation
-        cnt += 1
-
-    return (1e-9 * np.array(t_flip), 1e-9 * np.array(dt),
-            1e-9 * np.array(t_flip_interp), 1e-9 * np.array(dt_interp)), t_all, L_all
-
-
 def plot_periods(ax, args, times_and_periods_baseline,
                  times_and_periods_filtered, data, skip_plot, num_plot):
     """plot_pixel() plots pixel data"""
@@ -166,10 +94,11 @@ def make_graph(ax, args, data, res, cutoff_period, skip_plot, num_plot):
     if args.filter_pass_dt > 0:
         data = core_filtering.filter_noise(
             data, args.filter_pass_dt, args.filter_dead_dt)
-    L = reconstruct(data, cutoff_period)
-    plot_periods(ax, args, find_periods_baseline(data, L, cutoff_period),
-                 find_periods_filtered(data, L, cutoff_period), data,
-                 skip_plot, num_plot)
+    L = core_filtering.reconstruct(data, cutoff_period)
+    plot_periods(ax, args,
+                 core_filtering.find_periods_baseline(data, L, cutoff_period),
+                 core_filtering.find_periods_filtered(data, L, cutoff_period),
+                 data, skip_plot, num_plot)
 
 
 def to_tuple(ax):
@@ -209,12 +138,9 @@ if __name__ == '__main__':
     fig, axs = plt.subplots(nrows=len(cfg['graphs']), ncols=1, sharex=True)
     axs = to_tuple(axs)
      
-    for ax, c in zip(axs, cfg['graphs']):
-        array, res = read_bag_ros2.read_as_array(
-            bag_path=cfg['base_dir'] + '/' + c['bag'], topic=args.topic,
-            use_sensor_time=True, skip=c['skip'],
-            max_read=c['max_read'])
-        make_graph(ax, args, array[args.pixel], res,
+    pixel_data = graph_loader.load_graphs(cfg, args.pixel, args.topic)
+    for ax, c, (data, res) in zip(axs, cfg['graphs'], pixel_data):
+        make_graph(ax, args, data, res,
                    cutoff_period=c['cutoff_period'],
                    skip_plot=c['skip_events_plot'], num_plot=c['num_events_plot'])
 
@@ -19,7 +19,7 @@
 import matplotlib.pyplot as plt
 import argparse
 import numpy as np
-import read_bag_ros2
+import graph_loader
 import yaml
 import core_filtering
 
@@ -67,83 +67,29 @@ def set_font_size(axs, fontsize):
         set_tick_font_size(ax, fontsize)
 
 
-def find_periods_baseline(data, L, T):
-    last_t = [None, None]
-    last_p = None
-    period = [[], []]
-    times = [[], []]
-    cnt = int(0)
-    period_omit = -1
-    for i, d in enumerate(data):
-        t = d[0]
-        p = d[1]
-        if last_p is not None and last_p != p:
-            if p:
-                if last_t[0] is not None and cnt > period_omit:
-                    period[0].append(t - last_t[0])
-                    times[0].append((t, last_t[0], 1e9 * L[i]))
-                last_t[0] = t
-            else:
-                if last_t[1] is not None and cnt > period_omit:
-                    period[1].append(t - last_t[1])
-                    times[1].append((t, last_t[1], 1e9 * L[i]))
-                last_t[1] = t
-        last_p = p
-        cnt += 1
-    return 1e-9 * np.array(times[0]), 1e-9 * np.array(period[0]), \
-        1e-9 * np.array(times[1]), 1e-9 * np.array(period[1])
-
-
-def reconstruct(data, T):
-    alpha = core_filtering.compute_alpha_for_cutoff(T)
-    beta  = core_filtering.compute_beta_for_cutoff(T)
-    dL = np.where(data[:, 1] == 0, -1, 1)
-    return core_filtering.filter_iir(dL, alpha, beta, (0, 0))
-
-
 def find_periods_filtered(data, L_all, T):
     t_all = data[:, 0]
 
     # HACK:
     # special initialization to capture the first period
-    # of this particular dataset
-    period_omit = -1
-    t_prev, L_prev = t_all[0], 0
-    upper_half = True  # set to upper half, just for this data set
-    t_flip = [(t_prev, t_prev, 1e9*L_prev)]
-    t_flip_interp = [(t_prev, t_prev, 1e9*L_prev)]
-    dt, dt_interp = [], []
-    cnt = 0
-    for t, L in zip(t_all, L_all):
-        if upper_half and L < 0:
-            if cnt > period_omit:
-                # regular periods
-                if t_flip: # has element
-                    dt.append(t - t_flip[-1][0])
-                    t_flip.append((t, t_flip[-1][0], L * 1e9))
-                else:
-                    t_flip.append((t, t, L * 1e9))
-                # ------ interpolated periods
-                if L_prev:
-                    dt_int = t - t_prev
-                    dL_int = L - L_prev
-                    t_interp = t_prev - dt_int * L_prev / dL_int
-                    if t_flip_interp:
-                        dt_interp.append(t_interp - t_flip_interp[-1][0])
-                        t_flip_interp.append(
-                            (t_interp, t_flip_interp[-1][0], 0))
-                    else:
-                        t_flip_interp.append((t_interp, t_interp, 0))
-        upper_half = L > 0
-        t_prev = t  # for interpolation
-        L_prev = L  # for interpolation
-        cnt += 1
+    # of this particular dataset: start in the upper half, with
+    # a fake crossing (L = 0) at the first event
+    idx = core_filtering.find_zero_crossings(L_all, upper_half=True)
+    # regular periods
+    t = np.concatenate((t_all[:1], t_all[idx]))
+    dt = t[1:] - t[:-1]
+    t_flip = np.column_stack((t[1:], t[:-1], L_all[idx] * 1e9))
+    # interpolated periods (none for a crossing at the first event)
+    idx = idx[idx > 0]
+    t_interp = np.concatenate(
+        (t_all[:1], core_filtering.interpolate_crossings(t_all, L_all, idx)))
+    dt_interp = t_interp[1:] - t_interp[:-1]
+    t_flip_interp = np.column_stack(
+        (t_interp[1:], t_interp[:-1], np.zeros(dt_interp.shape[0])))
     # remove the first two elements as they are spurious
-    del t_flip[0:2]
-    del t_flip_interp[0:2]
-    return (1e-9 * np.array(t_flip), 1e-9 * np.array(dt),
-            1e-9 * np.array(t_flip_interp),
-            1e-9 * np.array(dt_interp)), t_all, L_all
+    return (1e-9 * t_flip[1:], 1e-9 * dt,
+            1e-9 * t_flip_interp[1:],
+            1e-9 * dt_interp), t_all, L_all
 
 
 def dilate_time(t_all, t_start, do_dilate):
@@ -280,9 +226,10 @@ def make_graph(ax_top, ax_bot, args, data, res,
     if args.filter_pass_dt > 0:
         data = core_filtering.filter_noise(
             data, args.filter_pass_dt, args.filter_dead_dt)
-    L = reconstruct(data, cutoff_period)
+    L = core_filtering.reconstruct(data, cutoff_period)
     plot_periods(ax_top, ax_bot, args,
-                 find_periods_baseline(data, L, cutoff_period),
+                 core_filtering.find_periods_baseline(
+                     data, L, cutoff_period, period_omit=-1),
                  find_periods_filtered(data, L, cutoff_period), data,
                  skip_plot, num_plot)
 
@@ -319,13 +266,10 @@ if __name__ == '__main__':
     cfg = read_yaml(args.config_file)
     fig, axs = plt.subplots(nrows=2*len(cfg['graphs']), ncols=1, sharex=True)
      
-    for i, c in enumerate(cfg['graphs']):
-        array, res = read_bag_ros2.read_as_array(
-            bag_path=cfg['base_dir'] + '/' + c['bag'], topic=args.topic,
-            use_sensor_time=True, skip=c['skip'],
-            max_read=c['max_read'])
+    pixel_data = graph_loader.load_graphs(cfg, args.pixel, args.topic)
+    for i, (c, (data, res)) in enumerate(zip(cfg['graphs'], pixel_data)):
         make_graph(axs[2 * i], axs[2 * i + 1],
-                   args, array[args.pixel], res,
+                   args, data, res,
                    cutoff_period=c['cutoff_period'],
                    skip_plot=c['skip_events_plot'], num_plot=c['num_events_plot'])
     #fig.tight_layout()
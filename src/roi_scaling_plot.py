@@ -22,7 +22,7 @@ import matplotlib.ticker as plticker
 
 import argparse
 import numpy as np
-import read_bag_ros2
+import graph_loader
 import yaml
 import core_filtering
 
@@ -206,25 +206,16 @@ if __name__ == '__main__':
     if not isinstance(axs, np.ndarray):
         axs = np.array([axs])
     
-    arrays, res = [], []
-    for ax, c in zip(axs, cfg['graphs']):
-        print('reading events for pixel!')
-        a, r = read_bag_ros2.read_events_for_pixels(
-            bag_path=cfg['base_dir'] + '/' + c['bag'],
-            pixel_list=[args.pixel],
-            topic=args.topic,
-            use_sensor_time=True, skip=c['skip_read'],
-            max_read=c['max_read'])
-        arrays.append(a)
-        res.append(r)
+    print('reading events for pixel!')
+    pixel_data = graph_loader.load_graphs(
+        cfg, args.pixel, args.topic, reader='pixels', skip_key='skip_read')
 
     t_lim = np.min(np.array(
-        [a[args.pixel][-1, 0]
-         - a[args.pixel][cfg['graphs'][-1]['skip_plot'], 0]
-         for a in arrays]))
+        [a[-1, 0] - a[cfg['graphs'][-1]['skip_plot'], 0]
+         for a, _ in pixel_data]))
     
-    for ax, c, a, r in zip(axs, cfg['graphs'], arrays, res):
-        make_graph(ax,  args, a[args.pixel], r, t_lim, c)
+    for ax, c, (a, r) in zip(axs, cfg['graphs'], pixel_data):
+        make_graph(ax,  args, a, r, t_lim, c)
 
     #fig.tight_layout()
     plt.subplots_adjust(left=0.1, right=0.95, top=0.95, bottom=0.1,
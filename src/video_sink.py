@@ -0,0 +1,112 @@
+# -----------------------------------------------------------------------------
+# Copyright 2022 Bernd Pfrommer <bernd.pfrommer@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Destinations for rendered BGR frames: a JPEG directory or a video."""
+
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+import cv2
+
+
+class JpegSink():
+    """Writes every frame to output_dir/frame_NNNNN.jpg."""
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def write(self, frame, img):
+        if img is not None:
+            cv2.imwrite(str(self.output_dir / f"frame_{frame:05d}.jpg"), img)
+
+    def close(self):
+        pass
+
+
+class VideoSink():
+    """Encodes frames straight into a video file.
+
+    Frames are piped as raw BGR to an ffmpeg subprocess, which can also
+    mux in an audio file. Without ffmpeg, cv2.VideoWriter is used (no
+    audio). write() may be called from several threads: each call waits
+    until all frames before it have been written, so the video keeps the
+    frame order. Passing img=None skips a frame. Once a write has failed
+    (e.g. ffmpeg exited), all later writes raise right away.
+    """
+
+    def __init__(self, fname, width, height, fps, audio=None,
+                 ffmpeg='ffmpeg'):
+        self.lock = threading.Condition()
+        self.next_frame = 0
+        self.error = None  # first write error, later writes fail fast
+        self.proc, self.writer = None, None
+        ffmpeg = shutil.which(ffmpeg)
+        if ffmpeg is None:
+            if audio is not None:
+                print('WARNING: ffmpeg not found, video will have no audio!')
+            self.writer = cv2.VideoWriter(
+                str(fname), cv2.VideoWriter_fourcc(*'mp4v'), fps,
+                (width, height))
+            if not self.writer.isOpened():
+                raise RuntimeError(f'cannot open video writer for {fname}')
+            return
+        cmd = [ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+               '-s', f'{width}x{height}', '-framerate', str(fps), '-i', '-']
+        if audio is not None:
+            cmd += ['-i', str(audio), '-map', '0:v', '-map', '1:a',
+                    '-c:a', 'aac', '-shortest']
+        # libx264 with yuv420p needs even image dimensions
+        cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                '-c:v', 'libx264', '-pix_fmt', 'yuv420p', str(fname)]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame, img):
+        with self.lock:
+            self.lock.wait_for(lambda: self.next_frame == frame)
+            try:
+                if self.error is not None:
+                    raise RuntimeError(f'video writer failed: {self.error}')
+                if img is None:
+                    pass  # frame failed to render, skip it
+                elif self.proc is not None:
+                    if self.proc.poll() is not None:
+                        raise RuntimeError(
+                            f'ffmpeg exited: {self.proc.returncode}')
+                    self.proc.stdin.write(img.tobytes())
+                else:
+                    self.writer.write(img)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+                raise
+            finally:
+                # let the next frame go ahead even if this one failed
+                self.next_frame += 1
+                self.lock.notify_all()
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass  # ffmpeg is gone, its exit code tells why
+            if self.proc.wait() != 0:
+                raise RuntimeError(f'ffmpeg failed: {self.proc.returncode}')
+        else:
+            self.writer.release()